@@ -1,3 +1,10 @@
+import sys
+from pathlib import Path
+
+ROOT = str(Path(__file__).resolve().parents[1])
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
 import streamlit as st
 import numpy as np
 from PIL import Image
@@ -6,36 +13,76 @@ from matplotlib.colors import LinearSegmentedColormap
 from io import BytesIO
 import time
 
-def mandelbrot(h, w, max_iter, x_min, x_max, y_min, y_max):
-    """计算曼德勃罗特集"""
-    y, x = np.ogrid[y_min:y_max:h*1j, x_min:x_max:w*1j]
-    c = x + y*1j
-    z = c
-    divtime = max_iter + np.zeros(z.shape, dtype=int)
-
-    for i in range(max_iter):
-        z = z**2 + c
-        diverge = z*np.conj(z) > 2**2
-        div_now = diverge & (divtime == max_iter)
-        divtime[div_now] = i
-        z[diverge] = 2
-
-    return divtime
-
-def julia(h, w, max_iter, x_min, x_max, y_min, y_max, c):
-    """计算朱利亚集"""
-    y, x = np.ogrid[y_min:y_max:h*1j, x_min:x_max:w*1j]
-    z = x + y*1j
-    divtime = max_iter + np.zeros(z.shape, dtype=int)
-
-    for i in range(max_iter):
-        z = z**2 + c
-        diverge = z*np.conj(z) > 2**2
-        div_now = diverge & (divtime == max_iter)
-        divtime[div_now] = i
-        z[diverge] = 2
-
-    return divtime
+from core.colormap import matplotlib_palette, render_png
+from core.fractal import mandelbrot, julia, julia_batch
+from core.fractal_pool import mandelbrot_tiled, julia_tiled, julia_batch_tiled
+
+
+def get_cmap(color_scheme):
+    """颜色方案名称 -> Matplotlib colormap"""
+    if color_scheme == "热力图":
+        return "hot"
+    elif color_scheme == "彩虹":
+        return "rainbow"
+    elif color_scheme == "蓝黑":
+        return "Blues"
+    colors = [(0, 0, 0), (0, 0, 1), (1, 0, 0)]
+    return LinearSegmentedColormap.from_list("custom", colors)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def julia_sweep_thumbnails(size, max_iter, bounds, c_pairs, color_scheme, use_pool):
+    """
+    批量计算一组 c 的朱利亚集缩略图，返回 PNG 字节列表
+    :param c_pairs: (实部, 虚部) 元组，st.cache_data 无法对 complex 求哈希
+    """
+    compute = julia_batch_tiled if use_pool else julia_batch
+    c_values = [complex(re, im) for re, im in c_pairs]
+    fractals = compute(size, size, max_iter, *bounds, c_values)
+    palette = matplotlib_palette(get_cmap(color_scheme))
+    return [render_png(fractal, palette) for fractal in fractals]
+
+
+def show_julia_sweep(sweep, resolution, color_scheme, use_pool):
+    """显示参数扫描的缩略图联系表，点击缩略图后按相同参数渲染全分辨率图像"""
+    state = st.session_state
+    n = sweep["grid"]
+    with st.spinner("正在批量计算缩略图..."):
+        start = time.perf_counter()
+        c_pairs = tuple((float(c.real), float(c.imag)) for c in sweep["c_values"])
+        thumbnails = julia_sweep_thumbnails(sweep["size"], sweep["max_iter"], sweep["bounds"],
+                                            c_pairs, color_scheme, use_pool)
+        elapsed = time.perf_counter() - start
+    st.subheader("参数扫描")
+    st.caption(f"{len(thumbnails)} 个朱利亚集，耗时 {elapsed:.2f} 秒，点击 c 值查看全分辨率图像")
+
+    for row in range(n):
+        cols = st.columns(n)
+        for col in range(n):
+            i = row * n + col
+            c = sweep["c_values"][i]
+            with cols[col]:
+                st.image(thumbnails[i])
+                if st.button(f"{c.real:+.3f}{c.imag:+.3f}i", key=f"julia_thumb_{i}"):
+                    state.julia_selected = i
+
+    selected = state.get("julia_selected")
+    if selected is None:
+        return
+    c = sweep["c_values"][selected]
+    st.subheader(f"朱利亚集 c = {c.real:+.4f}{c.imag:+.4f}i")
+    with st.spinner("正在生成全分辨率图像..."):
+        compute = julia_tiled if use_pool else julia
+        fractal = compute(resolution, resolution, sweep["max_iter"], *sweep["bounds"], c)
+        image_data = render_png(fractal, matplotlib_palette(get_cmap(color_scheme)))
+    st.image(image_data)
+    st.download_button(
+        label="下载图像",
+        data=image_data,
+        file_name=f"julia_{int(time.time())}.png",
+        mime="image/png"
+    )
+
 
 def main():
     st.title("分形图探索工具")
@@ -76,6 +123,13 @@ def main():
             ["热力图", "彩虹", "蓝黑", "自定义"],
             key="color_scheme"
         )
+
+        # 多核渲染
+        use_pool = st.checkbox("多核渲染", value=True, key="use_pool")
+
+        # 默认直接显示调色板图像，Matplotlib 图表（坐标轴、色条）按需开启
+        use_figure = st.checkbox("Matplotlib 图表", value=False, key="use_figure",
+                                 help="显示坐标轴和色条，渲染较慢")
         
         # 坐标范围
         st.subheader("坐标范围")
@@ -85,53 +139,81 @@ def main():
         y_max = st.number_input("Y最大值", value=1.5, format="%.2f", key="y_max")
         
         # 朱利亚集参数
+        sweep_mode = False
         if fractal_type == "朱利亚集":
             st.subheader("朱利亚集参数")
             c_real = st.number_input("C实部", value=-0.4, format="%.3f", key="c_real")
             c_imag = st.number_input("C虚部", value=0.6, format="%.3f", key="c_imag")
             c = complex(c_real, c_imag)
+
+            # 参数扫描：一次批量计算多个 c 的缩略图
+            sweep_mode = st.checkbox("参数扫描", key="sweep_mode")
+            if sweep_mode:
+                c_real_range = st.slider("C实部范围", -1.5, 1.0, (-1.0, 0.5), key="c_real_range")
+                c_imag_range = st.slider("C虚部范围", -1.0, 1.0, (-0.8, 0.8), key="c_imag_range")
+                sweep_grid = st.slider("扫描网格", 2, 8, 6, key="sweep_grid")
+                thumb_size = st.slider("缩略图尺寸", 64, 256, 128, step=32, key="thumb_size")
+                if st.button("生成参数扫描", key="generate_sweep"):
+                    st.session_state.julia_sweep = {
+                        "grid": sweep_grid,
+                        "size": thumb_size,
+                        "max_iter": max_iter,
+                        "bounds": (x_min, x_max, y_min, y_max),
+                        # 实部沿列增加，虚部沿行从上到下减小
+                        "c_values": tuple(
+                            complex(re, im)
+                            for im in np.linspace(c_imag_range[1], c_imag_range[0], sweep_grid)
+                            for re in np.linspace(c_real_range[0], c_real_range[1], sweep_grid)
+                        ),
+                    }
+                    st.session_state.julia_selected = None
         
         # 生成按钮
         generate = st.button("生成分形", key="generate")
 
+    if fractal_type == "朱利亚集" and sweep_mode and "julia_sweep" in st.session_state:
+        show_julia_sweep(st.session_state.julia_sweep, resolution, color_scheme, use_pool)
+
     # 主页面显示
     if generate:
         with st.spinner("正在生成分形图..."):
             # 创建图像
             if fractal_type == "曼德勃罗特集":
-                fractal = mandelbrot(resolution, resolution, max_iter, 
-                                   x_min, x_max, y_min, y_max)
+                compute = mandelbrot_tiled if use_pool else mandelbrot
+                fractal = compute(resolution, resolution, max_iter,
+                                  x_min, x_max, y_min, y_max)
             else:
-                fractal = julia(resolution, resolution, max_iter, 
-                              x_min, x_max, y_min, y_max, c)
+                compute = julia_tiled if use_pool else julia
+                fractal = compute(resolution, resolution, max_iter,
+                                  x_min, x_max, y_min, y_max, c)
             
             # 设置颜色方案
-            if color_scheme == "热力图":
-                cmap = "hot"
-            elif color_scheme == "彩虹":
-                cmap = "rainbow"
-            elif color_scheme == "蓝黑":
-                cmap = "Blues"
-            else:
-                colors = [(0, 0, 0), (0, 0, 1), (1, 0, 0)]
-                cmap = LinearSegmentedColormap.from_list("custom", colors)
-            
-            # 创建图像
-            fig, ax = plt.subplots(figsize=(10, 10))
-            im = ax.imshow(fractal, cmap=cmap, extent=[x_min, x_max, y_min, y_max])
-            plt.colorbar(im)
-            ax.set_title(f"{fractal_type} - {max_iter}次迭代")
+            cmap = get_cmap(color_scheme)
             
-            # 显示图像
-            st.pyplot(fig)
-            
-            # 下载选项
-            buf = BytesIO()
-            plt.savefig(buf, format="png", dpi=300, bbox_inches="tight")
-            buf.seek(0)
+            if use_figure:
+                # 创建图像
+                fig, ax = plt.subplots(figsize=(10, 10))
+                im = ax.imshow(fractal, cmap=cmap, extent=[x_min, x_max, y_min, y_max])
+                plt.colorbar(im)
+                ax.set_title(f"{fractal_type} - {max_iter}次迭代")
+
+                # 显示图像
+                st.pyplot(fig)
+
+                # 下载选项
+                buf = BytesIO()
+                plt.savefig(buf, format="png", dpi=300, bbox_inches="tight")
+                plt.close(fig)
+                buf.seek(0)
+                image_data = buf
+            else:
+                # 迭代次数经调色板直接映射为图像
+                image_data = render_png(fractal, matplotlib_palette(cmap))
+                st.image(image_data, caption=f"{fractal_type} - {max_iter}次迭代")
+
             st.download_button(
                 label="下载图像",
-                data=buf,
+                data=image_data,
                 file_name=f"fractal_{int(time.time())}.png",
                 mime="image/png"
             )
@@ -1,22 +1,21 @@
+import sys
+from pathlib import Path
+
+ROOT = str(Path(__file__).resolve().parents[1])
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import itertools
+
 import streamlit as st
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.colors import LinearSegmentedColormap
 
-def mandelbrot(h, w, max_iter, x_min, x_max, y_min, y_max):
-    y, x = np.ogrid[y_min:y_max:h*1j, x_min:x_max:w*1j]
-    c = x + y*1j
-    z = c
-    divtime = max_iter + np.zeros(z.shape, dtype=int)
-
-    for i in range(max_iter):
-        z = z**2 + c
-        diverge = z*np.conj(z) > 2**2
-        div_now = diverge & (divtime == max_iter)
-        divtime[div_now] = i
-        z[diverge] = 2
-
-    return divtime
+from core.colormap import matplotlib_palette, render_png
+from core.fractal import mandelbrot
+from core.fractal_pool import mandelbrot_tiled
+from core.frame_pipeline import FramePipeline
 
 def create_clean_figure(fractal, cmap, extent):
     fig = plt.figure(figsize=(8, 8))
@@ -54,7 +53,14 @@ def main():
             ["热力图", "彩虹", "蓝黑", "自定义"]
         )
         
+        # 多核渲染
+        use_pool = st.checkbox("多核渲染", True)
+
+        # 默认直接显示调色板图像，Matplotlib 图表按需开启
+        use_figure = st.checkbox("Matplotlib 图表", False)
+
         # 动画控制
+        target_fps = st.slider("目标帧率", 1, 30, 20)
         is_animating = st.checkbox("开始动画", True)
 
     # 设置颜色方案
@@ -68,34 +74,44 @@ def main():
         colors = [(0, 0, 0), (0, 0, 1), (1, 0, 0)]
         cmap = LinearSegmentedColormap.from_list("custom", colors)
 
-    # 动画循环
-    t = 0
-    while is_animating:
+    compute = mandelbrot_tiled if use_pool else mandelbrot
+
+    palette = matplotlib_palette(cmap)
+
+    def render_frame(t):
+        """后台线程中计算第 t 帧；Matplotlib 绘图不是线程安全的，留在页面线程"""
         # 计算动态边界
         scale = 2 * np.exp(-zoom_speed * t/50)
         angle = rotation_speed * t/50
-        
+
         # 计算旋转后的边界
         x_center = 0.5 * np.cos(angle) - 0.5
         y_center = 0.5 * np.sin(angle)
-        
-        x_min = x_center - scale
-        x_max = x_center + scale
-        y_min = y_center - scale
-        y_max = y_center + scale
-        
-        # 生成分形
-        fractal = mandelbrot(500, 500, max_iter, x_min, x_max, y_min, y_max)
-        
-        # 创建和显示图像
-        fig = create_clean_figure(fractal, cmap, [x_min, x_max, y_min, y_max])
-        plot_placeholder.pyplot(fig)
-        plt.close(fig)  # 清理内存
-        
-        t += 1
-        
-        # 控制动画速度
-        plt.pause(0.05)
+
+        extent = [x_center - scale, x_center + scale, y_center - scale, y_center + scale]
+        fractal = compute(500, 500, max_iter, *extent)
+        if use_figure:
+            return extent, fractal
+        return extent, render_png(fractal, palette)
+
+    # 动画循环：后台预渲染，按目标帧率显示
+    stats_placeholder = st.empty()
+    if is_animating:
+        with FramePipeline(render_frame, itertools.count(), target_fps=target_fps) as pipeline:
+            for _, _, (extent, frame) in pipeline.frames():
+                if use_figure:
+                    # 创建和显示图像
+                    fig = create_clean_figure(frame, cmap, extent)
+                    plot_placeholder.pyplot(fig)
+                    plt.close(fig)  # 清理内存
+                else:
+                    plot_placeholder.image(frame, width=800)
+
+                stats = pipeline.stats()
+                stats_placeholder.write(
+                    f"帧率: {stats['fps']:.1f} / {target_fps} · 队列: {stats['queue_depth']} · "
+                    f"丢帧: {stats['dropped']}"
+                )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,28 +1,367 @@
 import os
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = str(Path(__file__).resolve().parents[1])
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+from core.chart_agg import (MAX_POINTS, box_figure, column_values, density_figure, estimate_raw_bytes,
+                             histogram_figure, pair_values, payload_bytes, sample_rows)
+from core.correlation import correlation_matrix, heatmap_png, top_pairs
+from core.csv_stream import IngestCancelled, read_csv_chunked
+from core.data_cache import DatasetCache, content_key, file_key
+from core.excel_cache import ExcelCache
+from core.export import FORMATS, ExportCancelled, ExportDir, ExportJob
+from core.preview import IndexCache, preview_page, preview_positions
+from core.profile import profile_frame
+from core.query import AGGREGATIONS, OPS, Filter, Query, QueryEngine
+from core.sketch import sketch_frame
+
 
 plt.rcParams['font.sans-serif'] = ['Arial Unicode MS']  # Mac OS的中文字体
 # 或者使用
 # plt.rcParams['font.sans-serif'] = ['SimHei']  # Windows的中文字体
 plt.rcParams['axes.unicode_minus'] = False  # 用来正常显示负号
 
+# 超过该行数时默认使用近似统计
+APPROX_ROWS = 10_000_000
+# 相关性热力图超过该列数时不再逐格标注，改为图片
+ANNOTATE_COLUMNS = 20
+
+
+@st.cache_resource
+def get_dataset_cache():
+    """所有会话共享的数据集缓存"""
+    return DatasetCache(max_bytes=2 * 1024 ** 3)
+
+
+@st.cache_resource
+def get_excel_cache():
+    """Excel 工作表的 Arrow 磁盘缓存"""
+    return ExcelCache()
+
+
+def pick_sheet(source, key):
+    """列出工作表（不解析单元格），多于一个时显示选择框"""
+    try:
+        names = get_excel_cache().sheet_names(source, key)
+    except Exception as e:
+        st.error(f"错误: {str(e)}")
+        return None
+    if len(names) == 1:
+        return names[0]
+    return st.selectbox("选择工作表", names, key=f"sheet_{key}")
+
+
+def load_sheet(source, key, sheet):
+    """只解析选中的工作表，并转存为 Arrow 磁盘缓存"""
+    try:
+        return get_excel_cache().load_sheet(source, key, sheet)
+    except Exception as e:
+        st.error(f"错误: {str(e)}")
+        return None
+
+
+def cancel_ingest(key):
+    st.session_state[f"ingest_cancelled_{key}"] = True
+
+
+def resume_ingest(key):
+    st.session_state.pop(f"ingest_cancelled_{key}", None)
+
 
-def load_data(file):
-    """加载数据文件"""
+def load_csv_streaming(uploaded_file, key, downcast_floats):
+    """
+    分块读取上传的 CSV，显示进度条和取消按钮
+    点击取消会触发重跑，正在进行的读取随之中断；之后的重跑看到取消标记不再读取。
+    :return: (DataFrame, artifacts) 或 None
+    """
+    flag = f"ingest_cancelled_{key}"
+    progress = st.progress(0.0, text=f"正在读取 {uploaded_file.name} ...")
+    st.button("取消读取", key=f"cancel_{key}", on_click=cancel_ingest, args=(key,))
+
+    def on_progress(fraction, rows):
+        text = f"已读取 {rows:,} 行"
+        if fraction is None:
+            progress.progress(0.0, text=text)
+        else:
+            progress.progress(fraction, text=f"{text}（{fraction:.0%}）")
+
+    uploaded_file.seek(0)
     try:
-        if file.name.endswith('.csv'):
-            df = pd.read_csv(file)
-        elif file.name.endswith(('.xls', '.xlsx')):
-            df = pd.read_excel(file)
-        return df
+        df, stats = read_csv_chunked(uploaded_file, total_bytes=uploaded_file.size,
+                                     on_progress=on_progress,
+                                     should_cancel=lambda: st.session_state.get(flag, False),
+                                     downcast_floats=downcast_floats)
+    except IngestCancelled:
+        return None
     except Exception as e:
         st.error(f"错误: {str(e)}")
         return None
+    finally:
+        progress.empty()
+    # 均值、标准差和缺失值随读取累计完成，概况只需补算分位数和不同值个数
+    return df, {"profile": profile_frame(df, running=stats)}
+
+
+def upload_key(uploaded_file):
+    """上传文件的内容哈希，按 file_id 缓存在 session_state 中，重跑时不再对整个文件求哈希"""
+    keys = st.session_state.setdefault("upload_keys", {})
+    if uploaded_file.file_id not in keys:
+        keys.clear()
+        keys[uploaded_file.file_id] = content_key(uploaded_file.getvalue())
+    return keys[uploaded_file.file_id]
+
+
+def load_cached(uploaded_file, default_file):
+    """
+    通过缓存加载上传文件或默认文件
+    上传文件按内容哈希、默认文件按 路径+修改时间+大小 查找缓存，未命中时才解析。
+    CSV 分块读取并逐块压缩 dtype，概览统计在读取过程中累计。
+    Excel 文件只解析选中的工作表，并在磁盘上保留列式副本供之后的会话内存映射读取。
+    :return: CachedDataset 或 None
+    """
+    cache = get_dataset_cache()
+    if uploaded_file is not None:
+        key = upload_key(uploaded_file)
+        name = uploaded_file.name
+        if not name.endswith(('.xls', '.xlsx')):
+            downcast_floats = st.sidebar.checkbox("浮点列存为 float32", value=False,
+                                                  help="内存减半，但只保留约 7 位有效数字")
+            key = f"{key}:f32" if downcast_floats else key
+            if st.session_state.get(f"ingest_cancelled_{key}"):
+                st.warning(f"已取消读取 {name}")
+                st.button("重新读取", on_click=resume_ingest, args=(key,))
+                return None
+            return cache.get_or_load(key, lambda: load_csv_streaming(uploaded_file, key, downcast_floats),
+                                     name=name)
+        source = uploaded_file.getvalue()
+    elif os.path.exists(default_file):
+        source, key, name = default_file, file_key(default_file), os.path.basename(default_file)
+    else:
+        st.error(f"Error: {default_file} not found")
+        return None
+
+    sheet = pick_sheet(source, key)
+    if sheet is None:
+        return None
+    return cache.get_or_load(f"{key}:{sheet}", lambda: load_sheet(source, key, sheet),
+                             name=f"{name} [{sheet}]")
+
+
+@st.cache_resource
+def get_index_cache():
+    """所有会话共享的排序索引缓存，有单独的内存预算"""
+    return IndexCache(max_bytes=512 * 1024 ** 2)
+
+
+def get_query_engine(entry):
+    """数据集上的查询引擎，筛选结果和派生结果都缓存在这里"""
+    if "query_engine" not in entry.artifacts:
+        entry.artifacts["query_engine"] = QueryEngine(entry.df, entry.artifacts)
+    return entry.artifacts["query_engine"]
+
+
+def get_profile(view):
+    """数据集（或筛选结果）的概况，每个数据集、每组筛选条件只计算一次，页面各部分共用"""
+    if "profile" not in view.artifacts:
+        view.artifacts["profile"] = profile_frame(view.frame())
+    return view.artifacts["profile"]
+
+
+def get_sketch(view):
+    """近似数据集概况（分位数、不同值个数为摘要估计），同样只计算一次"""
+    if "sketch" not in view.artifacts:
+        view.artifacts["sketch"] = sketch_frame(view.frame())
+    return view.artifacts["sketch"]
+
+
+def get_correlation(view, columns, dtype):
+    """相关系数矩阵，按 (列, 精度) 缓存"""
+    key = ("corr", tuple(columns), np.dtype(dtype).name)
+    if key not in view.artifacts:
+        view.artifacts[key] = correlation_matrix(view.frame(columns), columns, dtype)
+    return view.artifacts[key]
+
+
+def filter_value_input(op, values, numeric, key):
+    """按运算符和列类型显示取值输入框"""
+    if op in ("isnull", "notnull"):
+        return None
+    if op == "between":
+        col1, col2 = st.columns(2)
+        return (col1.number_input("下界", value=0.0, key=f"{key}_lo"),
+                col2.number_input("上界", value=1.0, key=f"{key}_hi"))
+    if op == "isin":
+        return st.multiselect("取值", values, key=f"{key}_isin")
+    if values is not None and op in ("==", "!="):
+        return st.selectbox("取值", values, key=f"{key}_value")
+    if numeric and op != "contains":
+        return st.number_input("取值", value=0.0, key=f"{key}_number")
+    return st.text_input("取值", key=f"{key}_text")
+
+
+def build_query(entry, engine):
+    """
+    侧边栏：筛选条件和分组汇总
+    条件保存在 session_state 中，每次重跑只组成查询计划，不执行。
+    :return: Query
+    """
+    key = f"query_{entry.key}"
+    filters = st.session_state.setdefault(f"{key}_filters", [])
+    with st.sidebar:
+        st.subheader("筛选")
+        column = st.selectbox("列", list(entry.df.columns), key=f"{key}_column")
+        ops, values = engine.options(column)
+        op = st.selectbox("条件", ops, format_func=OPS.get, key=f"{key}_op")
+        value = filter_value_input(op, values, pd.api.types.is_numeric_dtype(entry.df[column]),
+                                   f"{key}_{column}")
+        if st.button("添加条件"):
+            filters.append(Filter(column, op, value))
+        for i, item in enumerate(filters):
+            col1, col2 = st.columns([4, 1])
+            col1.write(repr(item))
+            col2.button("删除", key=f"{key}_remove_{i}", on_click=filters.pop, args=(i,))
+
+        group_by = st.multiselect("分组", list(entry.df.columns), key=f"{key}_group_by")
+        agg_columns, agg = [], None
+        if group_by:
+            # 分组列不能同时作为汇总列，否则 reset_index 时列名冲突
+            numeric_columns = [col for col in entry.df.select_dtypes(include="number").columns
+                               if col not in group_by]
+            agg_columns = st.multiselect("汇总列", numeric_columns, key=f"{key}_agg_columns")
+            agg = st.selectbox("汇总方式", AGGREGATIONS, key=f"{key}_agg")
+        stats = engine.stats()
+        st.caption(f"查询缓存 {stats['entries']} 项，{stats['MB']} MB，命中 {stats['hits']} 次")
+    return Query(filters, group_by, {col: agg for col in agg_columns if col not in group_by})
+
+
+def show_preview(view, key):
+    """分页预览：只把当前页发给浏览器，排序和搜索由服务端的排序索引完成"""
+    columns = list(view.columns)
+    col1, col2, col3, col4 = st.columns([2, 1, 2, 2])
+    sort_column = col1.selectbox("排序列", [None] + columns, format_func=lambda c: "（原顺序）" if c is None else c,
+                                 key=f"{key}_sort")
+    descending = col2.checkbox("降序", key=f"{key}_desc")
+    search_column = col3.selectbox("搜索列", [None] + columns, format_func=lambda c: "（不搜索）" if c is None else c,
+                                   key=f"{key}_search_column")
+    term = col4.text_input("以此开头（数值列为等于）", key=f"{key}_term", disabled=search_column is None)
+
+    start = time.perf_counter()
+    positions = preview_positions(view, get_index_cache(), sort_column, not descending, search_column, term.strip())
+    total = len(view) if positions is None else len(positions)
+
+    col1, col2 = st.columns([1, 3])
+    page_size = col1.selectbox("每页行数", [20, 50, 100, 500], key=f"{key}_page_size")
+    pages = max((total - 1) // page_size + 1, 1)
+    # 页码完全由 session_state 管理；筛选或搜索后总页数可能变少
+    st.session_state.setdefault(f"{key}_page", 1)
+    if st.session_state[f"{key}_page"] > pages:
+        st.session_state[f"{key}_page"] = pages
+    page = col2.number_input(f"页码（共 {pages:,} 页）", min_value=1, max_value=pages, key=f"{key}_page")
+    st.dataframe(preview_page(view, positions, page - 1, page_size))
+    st.caption(f"共 {total:,} 行，本页耗时 {(time.perf_counter() - start) * 1000:.1f} ms"
+               "（每列第一次排序或搜索时建立索引）")
+
+
+def get_export_dir():
+    """本会话的导出目录，会话结束后随 session_state 一起回收删除"""
+    if "export_dir" not in st.session_state:
+        st.session_state.export_dir = ExportDir()
+    return st.session_state.export_dir
+
+
+def show_export(view, name, dataset_key):
+    """
+    在后台线程中生成导出文件，显示进度，完成后提供下载按钮
+    导出任务属于生成它时的数据集和筛选条件，两者之一改变时取消并丢弃旧任务。
+    """
+    fmt = st.selectbox("导出格式", list(FORMATS))
+    export_key = (dataset_key, view.key)
+    job = st.session_state.get("export_job")
+    if job is not None and st.session_state.get("export_key") != export_key:
+        job.cancel()
+        job.path.unlink(missing_ok=True)
+        job = st.session_state.export_job = None
+    if st.button("生成导出文件", disabled=job is not None and job.running):
+        stem = re.sub(r"[^\w\-]+", "_", Path(name).stem).strip("_") or "data"
+        path = get_export_dir().file(f"{stem}_processed{FORMATS[fmt][0]}")
+        job = ExportJob(view.frame(), fmt, path).start()
+        st.session_state.export_job = job
+        st.session_state.export_key = export_key
+    if job is None:
+        return
+
+    if job.running:
+        st.button("取消导出", on_click=job.cancel)
+        progress = st.progress(0.0)
+        # 只是轮询进度，页面上的其他操作会打断轮询，但不影响后台的导出
+        while job.running:
+            progress.progress(job.progress, text=f"已写出 {job.rows_written:,} / {len(job.df):,} 行")
+            time.sleep(0.2)
+        progress.empty()
+
+    if isinstance(job.error, ExportCancelled):
+        st.info("导出已取消")
+    elif job.error is not None:
+        st.error(f"导出失败: {job.error}")
+    elif job.done:
+        st.caption(f"{job.path.name}：{len(job.df):,} 行，{job.size / 2**20:.1f} MB，耗时 {job.seconds:.1f} s")
+        # st.download_button 不支持流式下载，会把整个文件读入服务器内存后交给浏览器；
+        # 写文件是分块的，但下载时内存占用仍等于文件大小，很大的导出宜选压缩格式
+        with open(job.path, "rb") as f:
+            st.download_button("下载", f, file_name=job.path.name, mime=job.mime)
+        if job.size > 512 * 2**20:
+            st.caption("文件较大，下载时会整体读入服务器内存，可改用 CSV (gzip) 或 Parquet 减小文件")
+
+
+def use_exact(key):
+    st.session_state[f"approx_{key}"] = False
+
+
+def show_chart(fig, raw_bytes):
+    """显示图表，并注明发送的字节数和相对逐行绘制的压缩比"""
+    st.plotly_chart(fig)
+    sent = payload_bytes(fig)
+    st.caption(f"发送 {sent / 1024:,.0f} KB，逐行绘制约 {raw_bytes / 1024:,.0f} KB"
+               f"（减少到 1/{max(raw_bytes / max(sent, 1), 1):,.0f}）")
+
+
+def show_cache_panel():
+    """侧边栏：缓存的数据集、大小和命中率"""
+    cache = get_dataset_cache()
+    with st.sidebar:
+        st.subheader("数据集缓存")
+        totals = cache.totals()
+        lookups = totals["hits"] + totals["misses"]
+        col1, col2 = st.columns(2)
+        col1.metric("命中率", f"{totals['hits'] / lookups:.0%}" if lookups else "-")
+        col2.metric("占用", f"{totals['nbytes'] / 2**20:.1f} MB")
+        stats = cache.stats()
+        if stats:
+            st.dataframe(pd.DataFrame(stats), hide_index=True)
+        index_stats = get_index_cache().stats()
+        st.caption(f"排序索引 {index_stats['entries']} 项，{index_stats['MB']} MB")
+        if st.button("清空缓存"):
+            cache.clear()
+        excel_cache = get_excel_cache()
+        if excel_cache.enabled:
+            excel_stats = excel_cache.stats()
+            st.caption(f"Excel 磁盘缓存 {excel_stats['files']} 个工作表，"
+                       f"{excel_stats['MB']} / {excel_stats['max_MB']} MB，已淘汰 {excel_stats['evictions']} 个")
+            if st.button("清空 Excel 磁盘缓存"):
+                excel_cache.clear()
+
 
 def main():
     st.title("数据分析工具")
@@ -35,55 +374,77 @@ def main():
     else:
         col2.code("doc.md 文件不存在")
 
-    df = None
-    if uploaded_file is not None:
-        df = load_data(uploaded_file)
-    else:
-        default_file = os.path.expanduser("~/Downloads/学生成绩.xlsx")
-        if os.path.exists(default_file):
-            df = pd.read_excel(default_file)
-        else:
-            st.error(f"Error: {default_file} not found")
-    if df is not None:
+    default_file = os.path.expanduser("~/Downloads/学生成绩.xlsx")
+    entry = load_cached(uploaded_file, default_file)
+    show_cache_panel()
+    if entry is not None:
+        # 勾选状态完全由 session_state 管理，“改用精确统计”按钮的回调会改写它
+        st.session_state.setdefault(f"approx_{entry.key}", len(entry.df) >= APPROX_ROWS)
+        approximate = st.sidebar.checkbox(
+            "近似统计", key=f"approx_{entry.key}",
+            help="分位数、不同值个数和直方图用可合并摘要分块计算，内存占用与数据量无关")
+        engine = get_query_engine(entry)
+        # 筛选条件只组成查询计划，下面各部分取数据时才执行
+        query = build_query(entry, engine)
+        view = engine.view(query)
+        profile = get_sketch(view) if approximate else get_profile(view)
         # 显示基本信息
         st.header("数据概览")
-        st.write("数据形状:", df.shape)
+        st.write("数据形状:", profile.shape)
+        if not view.is_base:
+            st.caption(f"筛选后 {len(view):,} / {len(entry.df):,} 行")
+        st.caption(f"概况计算耗时 {profile.seconds * 1000:.0f} ms（每个数据集只计算一次）")
         
         # 数据预览
         st.subheader("数据预览")
-        st.dataframe(df.head())
+        show_preview(view, f"preview_{entry.key}")
+        
+        if query.group_by:
+            st.subheader("分组汇总")
+            st.dataframe(view.grouped(), hide_index=True)
         
         # 数据类型信息
         st.subheader("数据类型信息")
-        st.write(df.dtypes)
+        st.write(profile.summary())
         
         # 基本统计信息
         st.subheader("基本统计信息")
-        st.write(df.describe())
+        st.write(profile.describe)
+        if profile.approximate:
+            st.caption(f"分位数为近似值，秩误差不超过 ±{profile.quantile_error:.2%}（99% 置信度）；"
+                       f"数值列的不同值个数相对误差约 ±{profile.distinct_error:.1%}")
+            st.button("计算精确结果", on_click=use_exact, args=(entry.key,))
         
         # 缺失值分析
         st.subheader("缺失值分析")
-        missing_data = df.isnull().sum()
+        missing_data = profile.nulls
         st.write(missing_data[missing_data > 0])
         
         # 可视化部分
         st.header("数据可视化")
         
         # 选择要可视化的列
-        numeric_columns = df.select_dtypes(include=['float64', 'int64']).columns
-        categorical_columns = df.select_dtypes(include=['object']).columns
+        numeric_columns = profile.numeric_columns
+        categorical_columns = profile.categorical_columns
         
         # 直方图
         st.subheader("直方图")
         hist_column = st.selectbox("选择要显示直方图的列", numeric_columns)
-        fig = px.histogram(df, x=hist_column)
-        st.plotly_chart(fig)
+        if profile.approximate:
+            counts, edges = profile.histogram(hist_column)
+            fig = histogram_figure(None, hist_column, counts=counts, edges=edges)
+        else:
+            fig = histogram_figure(column_values(view.column(hist_column)), hist_column)
+        head = view.head(2000)
+        show_chart(fig, estimate_raw_bytes(lambda part: px.histogram(part, x=hist_column), head, len(view)))
         
         # 箱型图
         st.subheader("箱型图")
         box_column = st.selectbox("选择要显示箱型图的列", numeric_columns)
-        fig = px.box(df, y=box_column)
-        st.plotly_chart(fig)
+        # 四分位数直接取自数据集概况
+        quartiles = profile.describe.loc[["25%", "50%", "75%"], box_column].to_numpy()
+        fig = box_figure(column_values(view.column(box_column)), box_column, quartiles=quartiles)
+        show_chart(fig, estimate_raw_bytes(lambda part: px.box(part, y=box_column), head, len(view)))
         
         # 散点图
         if len(numeric_columns) >= 2:
@@ -97,23 +458,35 @@ def main():
             color_column = st.selectbox("选择颜色分类列（可选）", 
                                         ['None'] + list(categorical_columns))
             
-            if color_column == 'None':
-                fig = px.scatter(df, x=x_column, y=y_column)
+            color = None if color_column == 'None' else color_column
+            scatter_mode = "逐点"
+            if len(view) > MAX_POINTS:
+                scatter_mode = st.radio(f"超过 {MAX_POINTS:,} 个点时", ["密度图", "抽样"], horizontal=True)
+            if scatter_mode == "密度图":
+                fig = density_figure(*pair_values(view.frame([x_column, y_column]), x_column, y_column),
+                                     x_column, y_column)
             else:
-                fig = px.scatter(df, x=x_column, y=y_column, color=color_column)
-            st.plotly_chart(fig)
+                columns = list(dict.fromkeys([x_column, y_column] + ([color] if color else [])))
+                fig = px.scatter(sample_rows(view.frame(columns)), x=x_column, y=y_column, color=color)
+            show_chart(fig, estimate_raw_bytes(
+                lambda part: px.scatter(part, x=x_column, y=y_column, color=color), head, len(view)))
         
         # 相关性分析
         st.subheader("相关性分析")
-        corr = df[numeric_columns].corr()
-        fig, ax = plt.subplots(figsize=(10, 8))
-        sns.heatmap(corr, annot=True, cmap='coolwarm', ax=ax)
-        st.pyplot(fig)
+        use_f32 = st.checkbox("用 float32 计算", value=True, help="速度更快，误差约 1e-6")
+        corr = get_correlation(view, numeric_columns, np.float32 if use_f32 else np.float64)
+        top_k = st.slider("最强相关的列对", 5, 100, 20)
+        st.dataframe(top_pairs(corr, top_k), hide_index=True)
+        if len(numeric_columns) <= ANNOTATE_COLUMNS:
+            fig, ax = plt.subplots(figsize=(10, 8))
+            sns.heatmap(corr, annot=True, cmap='coolwarm', ax=ax)
+            st.pyplot(fig)
+        else:
+            st.image(heatmap_png(corr), caption=f"{len(numeric_columns)} 列的相关系数（蓝 -1，红 +1），"
+                                                "行列按数值列的原有顺序排列")
         
         # 数据导出
         st.header("数据导出")
-        if st.button("导出处理后的数据"):
-            df.to_csv('processed_data.csv', index=False)
-            st.success("数据已导出到 processed_data.csv")
+        show_export(view, entry.name, entry.key)
 
 main()
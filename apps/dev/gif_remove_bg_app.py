@@ -1,12 +1,64 @@
 import streamlit as st
-from rembg import remove
 from PIL import Image
 import os
+import sys
 from pathlib import Path
 import tempfile
+import time
+from functools import partial
 
-def process_image(input_path, output_path):
-    """处理普通图片"""
+ROOT = str(Path(__file__).resolve().parents[2])
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from core.gif_pipeline import remove_gif_background
+from core.mask_refine import fast_remove
+from core.rembg_session import DEFAULT_MODEL, MODELS, get_manager
+from core.result_cache import ResultCache, content_digest, result_key
+
+
+@st.cache_resource
+def get_session_manager():
+    """进程内共享的模型会话，每个模型只加载一次"""
+    return get_manager()
+
+
+# 质量/速度档位 -> (推理用图的最长边, 是否细化边缘)，原图档与直接调用 rembg 相同
+QUALITY_LEVELS = {
+    "最快": (512, False),
+    "快": (1024, True),
+    "均衡": (1536, True),
+    "精细": (2048, True),
+    "原图": (None, True),
+}
+
+
+@st.cache_resource
+def get_result_cache():
+    """处理结果的磁盘缓存，重复上传同一张图时直接返回结果"""
+    return ResultCache()
+
+
+def upload_digest(uploaded_file):
+    """上传文件的内容哈希，按 file_id 缓存在 session_state 中，拖动滑块、下载等重跑时不再对整个文件求哈希"""
+    digests = st.session_state.setdefault("upload_digests", {})
+    if uploaded_file.file_id not in digests:
+        digests.clear()
+        digests[uploaded_file.file_id] = content_digest(uploaded_file.getbuffer())
+    return digests[uploaded_file.file_id]
+
+
+def get_model_session(model_name, intra_op_threads, inter_op_threads):
+    manager = get_session_manager()
+    with st.spinner(f"正在加载模型 {model_name}..."):
+        return manager.get(model_name, intra_op_threads, inter_op_threads)
+
+
+def process_image(input_path, output_path, model, max_side=None, refine=True):
+    """
+    处理普通图片
+    :param max_side: 快速模式下推理用图的最长边，None 为原图推理
+    """
     try:
         st.info(f"正在处理图片: {input_path}")
         
@@ -21,7 +73,7 @@ def process_image(input_path, output_path):
         
         # 移除背景
         progress_text.text("2. 正在移除背景...")
-        output_image = remove(input_image)
+        output_image, timings = fast_remove(input_image, model.mask, max_side, refine)
         progress_bar.progress(0.7)
         
         # 保存图片前处理格式
@@ -34,11 +86,14 @@ def process_image(input_path, output_path):
         
         # 保存图片
         progress_text.text("3. 保存处理后的图片...")
+        start = time.perf_counter()
         output_image.save(output_path)
+        timings["保存"] = time.perf_counter() - start
         progress_bar.progress(1.0)
         
         progress_text.text("处理完成！")
         st.success(f"背景移除成功！已保存至: {output_path}")
+        st.caption("各阶段耗时：" + "，".join(f"{stage} {seconds:.2f} 秒" for stage, seconds in timings.items()))
         
         # 显示处理前后的图片对比
         col1, col2 = st.columns(2)
@@ -53,45 +108,23 @@ def process_image(input_path, output_path):
         st.error(f"处理过程中出现错误: {str(e)}")
         return False
 
-def process_gif(input_path, output_path):
-    """处理GIF图片"""
+def process_gif(input_path, output_path, model, workers=1, threshold=None, delta_area=0.0):
+    """处理GIF图片，解码与多帧推理并行进行，重复帧复用掩码"""
     try:
         # 打开GIF文件
         st.info(f"正在处理GIF: {input_path}")
         gif = Image.open(input_path)
         
-        # 获取GIF的所有帧
-        frames = []
-        frame_durations = []
-        
         # 创建进度条
         progress_bar = st.progress(0)
         progress_text = st.empty()
-        
-        try:
-            # 遍历所有帧
-            i = 0
-            while True:
-                gif.seek(i)
-                # 获取当前帧的持续时间
-                frame_durations.append(gif.info.get('duration', 100))
-                
-                # 处理当前帧
-                progress_text.text(f"正在处理第 {i+1} 帧...")
-                frame = Image.new('RGBA', gif.size, (0, 0, 0, 0))
-                frame.paste(gif)
-                # 移除背景
-                processed_frame = remove(frame)
-                frames.append(processed_frame)
-                
-                # 更新进度条
-                progress = min((i + 1) / 100, 1.0)  # 假设最��100帧，可以根据需要调整
-                progress_bar.progress(progress)
-                
-                i += 1
-                
-        except EOFError:
-            pass  # 到达GIF末尾
+
+        def on_progress(stats):
+            progress_bar.progress(stats.progress)
+            progress_text.text(f"已处理 {stats.done}/{stats.total} 帧，{stats.fps:.1f} 帧/秒")
+
+        frames, frame_durations, stats = remove_gif_background(gif, model.mask, workers, on_progress,
+                                                                threshold, delta_area)
         
         # 保存处理后的GIF
         progress_text.text("正在保存处理后的GIF...")
@@ -109,6 +142,10 @@ def process_gif(input_path, output_path):
         progress_bar.progress(1.0)
         progress_text.text("处理完成！")
         st.success(f"GIF处理成功！已保存至: {output_path}")
+        st.caption(f"共 {stats.total} 帧，推理耗时 {stats.seconds:.1f} 秒，{stats.fps:.1f} 帧/秒")
+        st.caption(f"实际推理 {stats.inferences} 次（其中局部推理 {stats.kinds['delta']} 次），"
+                   f"复用掩码省去 {stats.saved} 次（完全相同 {stats.kinds['exact']} 帧，"
+                   f"近似相同 {stats.kinds['similar']} 帧）")
         
         col1, col2 = st.columns(2)
         with col1:
@@ -125,6 +162,32 @@ def process_gif(input_path, output_path):
 # Streamlit界面
 st.title("图片背景移除工具")
 
+with st.sidebar:
+    st.subheader("模型设置")
+    model_name = st.selectbox("模型", MODELS, index=MODELS.index(DEFAULT_MODEL))
+    cpu_count = os.cpu_count() or 1
+    intra_op_threads = st.number_input("算子内线程数（0 为默认）", min_value=0, max_value=cpu_count, value=0)
+    inter_op_threads = st.number_input("算子间线程数（0 为默认）", min_value=0, max_value=cpu_count, value=0)
+    # 多帧并行时每帧的算子内线程数宜相应减少，两者之积约等于核数
+    gif_workers = st.number_input("GIF 并行帧数", min_value=1, max_value=cpu_count * 2,
+                                  value=min(cpu_count, 4))
+    quality = st.select_slider("大图处理：速度 ↔ 质量", options=list(QUALITY_LEVELS), value="均衡",
+                               help="在缩小的图上推理，掩码放大后只在边缘处按原图细化；小于该档尺寸的图按原图处理")
+    near_duplicates = st.checkbox("复用近似相同帧的掩码", value=False,
+                                  help="完全相同的帧总是复用掩码；开启后感知哈希足够接近的帧也复用，背景或主体有细微运动时可能不准")
+    threshold = st.slider("近似帧的汉明距离阈值", 0, 16, 2) if near_duplicates else None
+    delta_area = st.slider("局部推理的最大变化面积", 0.0, 0.5, 0.0, step=0.05,
+                           help="与上一帧的变化区域不超过整帧的该比例时只对变化区域推理，0 为不启用")
+    model = get_model_session(model_name, intra_op_threads, inter_op_threads)
+    st.caption(f"模型加载耗时 {model.load_seconds:.2f} 秒，内存增量 {model.memory_bytes / 2**20:.1f} MB")
+    with st.expander("已加载的模型"):
+        st.dataframe(get_session_manager().stats())
+    with st.expander("结果缓存"):
+        result_cache = get_result_cache()
+        st.write(result_cache.stats())
+        if st.button("清空结果缓存"):
+            result_cache.clear()
+
 # 选择处理类型
 file_type = st.radio(
     "选择要处理的文件类型",
@@ -135,37 +198,57 @@ file_type = st.radio(
 # 根据选择显示不同的文件上传器
 if file_type == "普通图片":
     uploaded_file = st.file_uploader("选择要处理的图片", type=['png', 'jpg', 'jpeg'])
-    file_processor = process_image
+    max_side, refine = QUALITY_LEVELS[quality]
+    file_processor = partial(process_image, max_side=max_side, refine=refine)
 else:
     uploaded_file = st.file_uploader("选择要处理的GIF", type=['gif'])
-    file_processor = process_gif
+    file_processor = partial(process_gif, workers=gif_workers, threshold=threshold, delta_area=delta_area)
 
 if uploaded_file is not None:
-    # 创建临时目录存放文件
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # 保存上传的文件
-        input_path = Path(temp_dir) / uploaded_file.name
-        with open(input_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        
-        # 设置输出路径，对于普通图片统一使用 PNG 格式
-        if file_type == "普通图片":
-            output_path = Path(temp_dir) / f"bg_removed_{input_path.stem}.png"
-        else:
-            output_path = Path(temp_dir) / f"bg_removed_{uploaded_file.name}"
-        
-        # 处理图片
-        if st.button("开始移除背景"):
-            if file_processor(str(input_path), str(output_path)):
-                # 如果处理成功，提供下载链接
-                if output_path.exists():
-                    with open(output_path, 'rb') as f:
-                        st.download_button(
-                            label="下载处理后的图片",
-                            data=f.read(),
-                            file_name=f"bg_removed_{uploaded_file.name}",
-                            mime=f"image/{output_path.suffix[1:]}"
-                        )
+    # 结果只取决于输入内容、模型和影响输出的选项
+    if file_type == "普通图片":
+        suffix, options = ".png", {"max_side": max_side, "refine": refine}
+    else:
+        suffix, options = ".gif", {"threshold": threshold, "delta_area": delta_area}
+    cache_key = result_key(upload_digest(uploaded_file), kind=file_type, model=model_name, **options)
+    result_name = f"bg_removed_{Path(uploaded_file.name).stem}{suffix}"
+    # 每次上传只计一次命中，下载等操作引起的重跑不重复计数
+    counted = st.session_state.setdefault("result_cache_counted", set())
+    lookup = (uploaded_file.file_id, cache_key)
+    result_path = result_cache.get(cache_key, suffix, count=lookup not in counted)
+    counted.add(lookup)
+
+    if result_path is not None:
+        st.success("该图片已处理过，直接使用缓存的结果")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.image(uploaded_file, caption="原图")
+        with col2:
+            st.image(str(result_path), caption="处理后")
+    elif st.button("开始移除背景"):
+        # 创建临时目录存放文件
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # 保存上传的文件
+            input_path = Path(temp_dir) / uploaded_file.name
+            with open(input_path, "wb") as f:
+                f.write(uploaded_file.getbuffer())
+
+            # 普通图片统一输出 PNG 格式
+            output_path = Path(temp_dir) / result_name
+
+            # 处理图片，成功后存入结果缓存
+            if file_processor(str(input_path), str(output_path), model) and output_path.exists():
+                result_path = result_cache.put(cache_key, suffix, output_path)
+
+    if result_path is not None:
+        # 提供下载链接
+        with open(result_path, 'rb') as f:
+            st.download_button(
+                label="下载处理后的图片",
+                data=f.read(),
+                file_name=result_name,
+                mime=f"image/{suffix[1:]}"
+            )
 
 # 添加说明信息
 with st.expander("使用说明"):
@@ -184,4 +267,5 @@ with st.expander("使用说明"):
     - GIF处理可能需要较长时间，请耐心等待
     - 建议上传的图片大小不要超过10MB
     - 处理后的图片将保留原始格式
+    - 同一文件以相同的模型和设置再次上传时，直接使用缓存的结果
     """)
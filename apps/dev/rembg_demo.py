@@ -1,16 +1,24 @@
 # 方法1：使用 rembg (推荐，最简单)
-from rembg import remove
+import sys
+from pathlib import Path
+
 from PIL import Image
 
-def remove_bg_rembg(input_path, output_path):
+ROOT = str(Path(__file__).resolve().parents[2])
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from core.rembg_session import DEFAULT_MODEL, get_manager
+
+
+def remove_bg_rembg(input_path, output_path, model_name=DEFAULT_MODEL):
     # 读取图片
     input_image = Image.open(input_path)
-    # 移除背景
-    output_image = remove(input_image)
+    # 移除背景，模型在第一次调用时加载，之后复用进程内共享的会话
+    output_image = get_manager().get(model_name).remove(input_image)
     # 保存图片
     output_image.save(output_path)
-    
 
-remove_bg_rembg("jy.gif", "jy_bg_removed.gif")
-    
-    
\ No newline at end of file
+
+if __name__ == "__main__":
+    remove_bg_rembg("jy.gif", "jy_bg_removed.gif")
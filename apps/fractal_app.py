@@ -1,37 +1,54 @@
+import sys
+from pathlib import Path
+
+ROOT = str(Path(__file__).resolve().parents[1])
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
 import streamlit as st
 import plotly.graph_objects as go
 import numpy as np
-import time
+from functools import partial
 import matplotlib.pyplot as plt
 import matplotlib as mpl
 import matplotlib.font_manager
 
+from core.colormap import plotly_palette, render_png
+from core.fractal import mandelbrot, mandelbrot_lean, progressive
+from core.fractal_deep import mandelbrot_smooth
+from core.fractal_pool import mandelbrot_tiled
+from core.fractal_tiles import TileCache
+from core.frame_pipeline import FramePipeline
+
 
-def mandelbrot(h, w, x_min, x_max, y_min, y_max, max_iter):
+def make_figure(fractal, colorscale, showscale=False, step=1):
     """
-    计算曼德勃罗特集合
-    :param h: 高度
-    :param w: 宽度
-    :param x_min: x的最小值
-    :param x_max: x的最大值
-    :param y_min: y的最小值
-    :param y_max: y的最大值
-    :param max_iter: 最大迭代次数
-    :return: 曼德勃罗特集合
+    创建分形热力图
+    :param step: 采样步长，粗分辨率预览时用于保持坐标轴与全分辨率一致
     """
-    y, x = np.ogrid[y_min:y_max:h*1j, x_min:x_max:w*1j]
-    c = x + y*1j
-    z = c
-    divtime = max_iter + np.zeros(z.shape, dtype=int)
+    fig = go.Figure(data=go.Heatmap(
+        z=fractal,
+        dx=step,
+        dy=step,
+        colorscale=colorscale,
+        showscale=showscale
+    ))
+    fig.update_layout(
+        width=800,
+        height=800,
+        xaxis=dict(showticklabels=True),
+        yaxis=dict(showticklabels=True),
+        plot_bgcolor='black',
+        paper_bgcolor='black'
+    )
+    return fig
+
 
-    for i in range(max_iter):
-        z = z**2 + c
-        diverge = z*np.conj(z) > 2**2
-        div_now = diverge & (divtime == max_iter)
-        divtime[div_now] = i
-        z[diverge] = 2
+@st.cache_resource
+def get_tile_cache():
+    """所有会话共享的瓦片缓存"""
+    return TileCache(max_bytes=256 * 1024 ** 2)
 
-    return divtime
 
 st.title("Mandelbrot Set")
 state = st.session_state
@@ -47,11 +64,63 @@ with st.sidebar:
         "Select a color scheme",
         ['Viridis', 'Plasma', 'Inferno', 'Magma', 'Hot', 'Electric']
     )
+    kernel = st.selectbox(
+        "Kernel",
+        ["Escape time", "Smooth", "Smooth + perturbation"],
+        help="Smooth kernels skip interior points early (cardioid/bulb test, periodicity check) "
+             "and color with fractional iteration counts; perturbation keeps deep zooms accurate"
+    )
+    renderer = st.radio("Renderer", ["Image", "Plotly heatmap"], horizontal=True,
+                        help="Image sends a palette PNG; the heatmap is interactive but much heavier")
+    use_pool = st.checkbox("Multi-core rendering", True)
+    use_progressive = st.checkbox("Progressive preview", True,
+                                  help="Draw 1/8, 1/4, 1/2 resolution passes before the full frame")
+    use_tile_cache = st.checkbox("Tile cache", False,
+                                 help="Assemble the view from cached tiles by nearest-neighbor sampling; "
+                                      "an approximation of a direct render. Replaces the progressive preview")
+    # 平滑核和分块缓存只有 float64 实现
+    if kernel == "Escape time" and not use_tile_cache:
+        precision = st.radio("Precision", ["float64", "float32"], horizontal=True,
+                             help="float32 runs in place on preallocated buffers and returns uint16 counts; "
+                                  "it loses accuracy at deep zoom")
+    else:
+        precision = st.radio("Precision", ["float64"], horizontal=True, disabled=True,
+                             help="Smooth kernels and the tile cache always compute in float64")
+    lean = precision == "float32"
+
+tile_cache = get_tile_cache()
+if kernel == "Smooth":
+    compute = partial(mandelbrot_smooth, perturbation=False)
+elif kernel == "Smooth + perturbation":
+    compute = partial(mandelbrot_smooth, perturbation=True)
+elif use_tile_cache:
+    compute = tile_cache.render
+elif use_pool:
+    compute = partial(mandelbrot_tiled, lean=lean)
+else:
+    compute = mandelbrot_lean if lean else mandelbrot
+
+
+def render(fractal, step=1, showscale=False):
+    """按所选方式生成一帧：调色板 PNG 字节或 Plotly 图表"""
+    if renderer == "Plotly heatmap":
+        return make_figure(fractal, colorscale, showscale=showscale, step=step)
+    # heatmap 的 y 轴朝上，图像第一行在最上面，翻转后方向一致
+    return render_png(fractal[::-1], plotly_palette(colorscale))
+
+
+def show(frame, key=None):
+    """在 plot_placeholder 中显示 render() 生成的帧"""
+    if isinstance(frame, bytes):
+        plot_placeholder.image(frame, width=800)
+    else:
+        plot_placeholder.plotly_chart(frame, key=key)
      
 
 cols = st.columns([1, 3])
 with cols[0]:
     is_animating = st.checkbox("Start Animation", False)
+    target_fps = st.slider("Target FPS", 1, 30, 10)
     # x_min = st.slider("x的最小值", -2.0, 2.0, -1.4 + 0.2)
     # x_max = st.slider("x的最大值", -2.0, 2.0, 1.4 + 0.2)
     # y_min = st.slider("y的最小值", -2.0, 2.0, -1.4)
@@ -72,73 +141,84 @@ with cols[0]:
 with cols[1]:
     plot_placeholder = st.empty() 
 
-# 计算分形
-fractal = mandelbrot(resolution, resolution, x_min, x_max, y_min, y_max, max_iter)
-
-# 创建图表
-fig = go.Figure(data=go.Heatmap(
-    z=fractal,
-    colorscale=colorscale,
-    showscale=False
-))
-
-# 更新布局
-fig.update_layout(
-    width=800,
-    height=800,
-    xaxis=dict(showticklabels=True),
-    yaxis=dict(showticklabels=True),
-    plot_bgcolor='black',
-    paper_bgcolor='black'
-)
-
-# 显示图表
-plot_placeholder.plotly_chart(fig)
+# 计算分形并显示图表
+if use_progressive and not use_tile_cache and kernel == "Escape time":
+    # 多核时粗预览仍在本进程计算，全分辨率一级交给进程池；进程池不可用时 mandelbrot_tiled 退回本进程计算
+    steps = (8, 4, 2) if use_pool else (8, 4, 2, 1)
+    for step, fractal in progressive(resolution, resolution, max_iter, x_min, x_max, y_min, y_max,
+                                     steps=steps, lean=lean):
+        show(render(fractal, step=step), key=f"progressive_{step}")
+    if use_pool:
+        fractal = compute(resolution, resolution, max_iter, x_min, x_max, y_min, y_max)
+        show(render(fractal), key="progressive_1")
+else:
+    fractal = compute(resolution, resolution, max_iter, x_min, x_max, y_min, y_max)
+    show(render(fractal))
+    if use_tile_cache and kernel == "Escape time":
+        # 瓦片采样点固定在各级网格上，视窗像素取最近的采样点，不是按视窗像素直接计算的结果
+        cols[1].caption("Approximation: assembled from cached tiles by nearest-neighbor sampling; "
+                        "use \"Check tile accuracy\" in the sidebar to compare with a direct render")
 
 # 创建一个空的placeholder用于显示坐标值
 coords_placeholder = st.empty()
 
+def render_frame(i):
+    """后台线程中渲染第 i 步的缩放帧"""
+    bounds = (x_center - i * 0.01, x_center + i * 0.01,
+              y_center - i * 0.01, y_center + i * 0.01)
+    fractal = compute(resolution, resolution, max_iter, *bounds)
+    return bounds, render(fractal, showscale=True)
+
+
 if is_animating:
     steps = list(range(150))
     steps.reverse()
-    for i in steps:
-        
-        x_min = x_center - i * 0.01
-        x_max = x_center + i * 0.01
-        y_min = y_center - i * 0.01
-        y_max = y_center + i * 0.01
-        
-        fractal = mandelbrot(resolution, resolution, x_min, x_max, y_min, y_max, max_iter)
-        fig = go.Figure(data=go.Heatmap(
-            z=fractal,
-            colorscale=colorscale,
-            showscale=True
-        ))
-        
-        fig.update_layout(
-            width=800,
-            height=800,
-            xaxis=dict(showticklabels=True),
-            yaxis=dict(showticklabels=True),
-            plot_bgcolor='black',
-            paper_bgcolor='black'
-        )
-        
-        # 使用columns更新坐标值
-        cols = coords_placeholder.columns(2)
-        with cols[0]:
-            st.write("x_min: ", round(x_min, 2))
-            st.write("x_max: ", round(x_max, 2))
-        with cols[1]:
-            st.write("y_min: ", round(y_min, 2))
-            st.write("y_max: ", round(y_max, 2))
-            
-        plot_placeholder.plotly_chart(fig, key=f"plot_{i}")
-        
-        time.sleep(0.1)
+    pipeline_placeholder = st.empty()
+    with FramePipeline(render_frame, steps, target_fps=target_fps) as pipeline:
+        for _, i, ((x_min, x_max, y_min, y_max), frame) in pipeline.frames():
+            # 使用columns更新坐标值
+            cols = coords_placeholder.columns(2)
+            with cols[0]:
+                st.write("x_min: ", round(x_min, 2))
+                st.write("x_max: ", round(x_max, 2))
+            with cols[1]:
+                st.write("y_min: ", round(y_min, 2))
+                st.write("y_max: ", round(y_max, 2))
+
+            show(frame, key=f"plot_{i}")
+
+            stats = pipeline.stats()
+            pipeline_placeholder.write(
+                f"FPS: {stats['fps']:.1f} / {target_fps} · queue: {stats['queue_depth']} · "
+                f"dropped: {stats['dropped']}"
+            )
 
 with st.sidebar:
     st.write("x_min: ", x_min)
     st.write("x_max: ", x_max)
     st.write("y_min: ", y_min)
     st.write("y_max: ", y_max)
+
+    if use_tile_cache:
+        stats = tile_cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        st.subheader("Tile cache")
+        cols = st.columns(2)
+        cols[0].metric("Hits", stats["hits"])
+        cols[1].metric("Misses", stats["misses"])
+        st.write(f"Hit rate: {stats['hits'] / lookups:.1%}" if lookups else "Hit rate: -")
+        st.write(f"Tiles: {stats['tiles']} ({stats['bytes'] / 1024 ** 2:.1f} MB)")
+        if st.button("Clear tile cache"):
+            tile_cache.clear()
+        if st.button("Check tile accuracy"):
+            args = (resolution, resolution, max_iter, x_min, x_max, y_min, y_max)
+            diff = np.abs(tile_cache.render(*args).astype(int) - mandelbrot(*args))
+            st.write(f"Pixels differing from a direct render: {np.count_nonzero(diff) / diff.size:.3%}")
+            st.write(f"Max iteration difference: {diff.max()}")
+
+    if lean and st.button("Check float32 accuracy"):
+        args = (resolution, resolution, max_iter, x_min, x_max, y_min, y_max)
+        reference = mandelbrot(*args)
+        diff = np.abs(mandelbrot_lean(*args).astype(int) - reference)
+        st.write(f"Pixels differing from float64: {np.count_nonzero(diff) / diff.size:.3%}")
+        st.write(f"Max iteration difference: {diff.max()}")
@@ -0,0 +1,67 @@
+"""
+分形显示路径基准测试：每帧发送的字节数和渲染耗时
+
+对比 Plotly heatmap（JSON）、Matplotlib figure（st.pyplot 发送的 PNG）
+和调色板 LUT + st.image（调色板 PNG）三种方式。
+
+用法: python benchmarks/display_bench.py
+"""
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import matplotlib  # noqa: E402
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+import plotly.graph_objects as go  # noqa: E402
+
+from core.colormap import plotly_palette, render_png  # noqa: E402
+from core.fractal import mandelbrot  # noqa: E402
+
+
+def plotly_heatmap(fractal):
+    fig = go.Figure(data=go.Heatmap(z=fractal, colorscale="Viridis", showscale=False))
+    fig.update_layout(width=800, height=800)
+    return fig.to_json().encode()
+
+
+def matplotlib_figure(fractal):
+    fig, ax = plt.subplots(figsize=(10, 10))
+    im = ax.imshow(fractal, cmap="viridis")
+    plt.colorbar(im)
+    buf = BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
+
+
+def lut_image(fractal):
+    return render_png(fractal, plotly_palette("Viridis"))
+
+
+RENDERERS = [
+    ("plotly heatmap", plotly_heatmap),
+    ("matplotlib", matplotlib_figure),
+    ("LUT image", lut_image),
+]
+
+
+def main(repeat=3):
+    print(f"{'res':>5} {'renderer':<15} {'KB/frame':>10} {'ms/frame':>9}")
+    for res in (100, 250, 500, 1000):
+        fractal = mandelbrot(res, res, 100, -2.0, 1.0, -1.5, 1.5)
+        for name, render in RENDERERS:
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                payload = render(fractal)
+                best = min(best, time.perf_counter() - start)
+            print(f"{res:>5} {name:<15} {len(payload) / 1024:>10.1f} {best * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+分形内核基准测试与性能回归检查（不依赖 Streamlit）
+
+对 apps/fractal_app.py、apps/app3.py、apps/app6.py 使用的内核，按分辨率、最大迭代次数、
+缩放深度和曼德勃罗特/朱利亚模式组成的网格计时，记录墙钟时间、每秒像素数和峰值 RSS。
+每个用例在独立的子进程中运行，峰值 RSS 互不影响（多进程内核只统计主进程）。
+
+用法:
+    python benchmarks/fractal_bench.py --record          # 记录基线到 fractal_baseline.json
+    python benchmarks/fractal_bench.py                   # 与基线对比，超过阈值时退出码为 1
+    python benchmarks/fractal_bench.py --threshold 0.1 --res 500 --iter 100
+    python benchmarks/fractal_bench.py --legacy          # 与原全数组实现对比
+    python benchmarks/fractal_bench.py --precision       # float64 / float32 内核对比
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.fractal import julia, julia_lean, mandelbrot, mandelbrot_lean  # noqa: E402
+from core.fractal_deep import mandelbrot_smooth  # noqa: E402
+from core.fractal_pool import julia_tiled, mandelbrot_tiled, shutdown_pool  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "fractal_baseline.json"
+
+# 缩放中心取边界附近细节丰富的点
+MANDELBROT_CENTER = (-0.743643887037151, 0.131825904205330)
+JULIA_CENTER = (0.0, 0.0)
+JULIA_C = complex(-0.8, 0.156)
+BASE_HALF_WIDTH = 1.5
+
+# 内核名 -> (曼德勃罗特函数, 朱利亚函数)，没有对应实现的为 None
+KERNELS = {
+    "engine": (mandelbrot, julia),
+    "lean": (mandelbrot_lean, julia_lean),
+    "tiled": (mandelbrot_tiled, julia_tiled),
+    "smooth": (mandelbrot_smooth, None),
+}
+MODES = ("mandelbrot", "julia")
+RESOLUTIONS = (250, 500, 1000)
+MAX_ITERS = (100, 300)
+ZOOMS = (1, 1e2, 1e5)
+
+
+def case_key(kernel, mode, res, max_iter, zoom):
+    return f"{kernel}/{mode}/res{res}/iter{max_iter}/zoom{zoom:g}"
+
+
+def case_args(mode, res, max_iter, zoom):
+    """用例对应的内核参数"""
+    cx, cy = MANDELBROT_CENTER if mode == "mandelbrot" else JULIA_CENTER
+    half = BASE_HALF_WIDTH / zoom
+    args = (res, res, max_iter, cx - half, cx + half, cy - half, cy + half)
+    return args if mode == "mandelbrot" else args + (JULIA_C,)
+
+
+def peak_rss_mb():
+    """当前进程的峰值 RSS（Linux 上 ru_maxrss 单位为 KB，macOS 上为字节）"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def _run_case(kernel, mode, res, max_iter, zoom, repeat, queue):
+    """子进程：运行单个用例，结果放入 queue"""
+    try:
+        func = KERNELS[kernel][MODES.index(mode)]
+        args = case_args(mode, res, max_iter, zoom)
+        func(*args)  # 预热（进程池启动、导入等）
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(*args)
+            best = min(best, time.perf_counter() - start)
+        queue.put({
+            "wall_s": best,
+            "pixels_per_s": res * res / best,
+            "peak_rss_mb": peak_rss_mb(),
+        })
+    except Exception as e:
+        queue.put({"error": repr(e)})
+    finally:
+        # 子进程退出时 multiprocessing 会等待所有非守护子进程，必须先关掉进程池
+        shutdown_pool()
+
+
+def run_case(kernel, mode, res, max_iter, zoom, repeat):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_case, args=(kernel, mode, res, max_iter, zoom, repeat, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def iter_cases(kernels, modes, resolutions, max_iters, zooms):
+    for kernel, mode, res, max_iter, zoom in itertools.product(kernels, modes, resolutions, max_iters, zooms):
+        if KERNELS[kernel][MODES.index(mode)] is not None:
+            yield kernel, mode, res, max_iter, zoom
+
+
+def run_suite(args):
+    results = {}
+    print(f"{'case':<42} {'wall(ms)':>9} {'Mpx/s':>7} {'RSS(MB)':>8}")
+    for case in iter_cases(args.kernel, args.mode, args.res, args.iter, args.zoom):
+        key = case_key(*case)
+        result = run_case(*case, args.repeat)
+        results[key] = result
+        if "error" in result:
+            print(f"{key:<42} error: {result['error']}")
+        else:
+            print(f"{key:<42} {result['wall_s'] * 1000:>9.1f} "
+                  f"{result['pixels_per_s'] / 1e6:>7.2f} {result['peak_rss_mb']:>8.1f}")
+    return results
+
+
+def metadata():
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold, rss_threshold):
+    """
+    与基线对比
+    :return: 回归的用例列表 [(key, 指标, 基线值, 当前值)]
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None or "error" in base or "error" in result:
+            continue
+        if result["wall_s"] > base["wall_s"] * (1 + threshold):
+            regressions.append((key, "wall_s", base["wall_s"], result["wall_s"]))
+        if rss_threshold is not None and result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + rss_threshold):
+            regressions.append((key, "peak_rss_mb", base["peak_rss_mb"], result["peak_rss_mb"]))
+    return regressions
+
+
+def mandelbrot_legacy(h, w, max_iter, x_min, x_max, y_min, y_max):
+    """原 apps/fractal_app.py 中的全数组实现，作为对照"""
+    y, x = np.ogrid[y_min:y_max:h*1j, x_min:x_max:w*1j]
+    c = x + y*1j
+    z = c
+    divtime = max_iter + np.zeros(z.shape, dtype=int)
+
+    for i in range(max_iter):
+        z = z**2 + c
+        diverge = z*np.conj(z) > 2**2
+        div_now = diverge & (divtime == max_iter)
+        divtime[div_now] = i
+        z[diverge] = 2
+
+    return divtime
+
+
+def timeit(func, *args, repeat=3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def legacy_table():
+    """压缩式引擎与原全数组实现的对比（结果应完全一致）"""
+    cases = [
+        (500, 100, (-2.0, 1.0, -1.5, 1.5)),
+        (1000, 500, (-2.0, 1.0, -1.5, 1.5)),
+        (1000, 500, (0.07, 0.47, -0.2, 0.2)),
+    ]
+    print(f"{'res':>5} {'iter':>5} {'legacy(s)':>10} {'engine(s)':>10} {'speedup':>8} {'mismatch':>9}")
+    for res, max_iter, view in cases:
+        args = (res, res, max_iter) + view
+        t_old, old = timeit(mandelbrot_legacy, *args)
+        t_new, new = timeit(mandelbrot, *args)
+        mismatch = int(np.count_nonzero(old != new))
+        print(f"{res:>5} {max_iter:>5} {t_old:>10.3f} {t_new:>10.3f} {t_old / t_new:>7.1f}x {mismatch:>9}")
+
+
+def peak_memory(func, *args):
+    """单次调用期间 numpy 分配的峰值内存（字节）"""
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def precision_table(max_iter=200, view=(-2.0, 1.0, -1.5, 1.5)):
+    """float64 与 float32 原地内核的耗时、峰值内存和精度对比"""
+    print(f"{'res':>5} {'f64(ms)':>8} {'f32(ms)':>8} {'f64(MB)':>8} {'f32(MB)':>8} {'diff px':>8} {'max diff':>8}")
+    for res in (100, 250, 500, 750, 1000):
+        args = (res, res, max_iter) + view
+        t64, ref = timeit(mandelbrot, *args)
+        t32, lean = timeit(mandelbrot_lean, *args)
+        m64 = peak_memory(mandelbrot, *args) / 2**20
+        m32 = peak_memory(mandelbrot_lean, *args) / 2**20
+        diff = np.abs(lean.astype(int) - ref)
+        print(f"{res:>5} {t64 * 1000:>8.1f} {t32 * 1000:>8.1f} {m64:>8.1f} {m32:>8.1f} "
+              f"{np.count_nonzero(diff) / diff.size:>8.3%} {diff.max():>8}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="分形内核基准测试与性能回归检查")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="基线 JSON 路径")
+    parser.add_argument("--record", action="store_true", help="把本次结果写入基线")
+    parser.add_argument("--output", type=Path, help="另存本次结果的 JSON 路径")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="墙钟时间超过基线该比例即判为回归（默认 0.2 即 20%%）")
+    parser.add_argument("--rss-threshold", type=float, default=None,
+                        help="峰值 RSS 超过基线该比例即判为回归，默认不检查")
+    parser.add_argument("--repeat", type=int, default=3, help="每个用例取最快的一次")
+    parser.add_argument("--kernel", nargs="+", choices=list(KERNELS), default=list(KERNELS))
+    parser.add_argument("--mode", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--res", nargs="+", type=int, default=list(RESOLUTIONS))
+    parser.add_argument("--iter", nargs="+", type=int, default=list(MAX_ITERS))
+    parser.add_argument("--zoom", nargs="+", type=float, default=list(ZOOMS),
+                        help="缩放倍数，视窗半宽为 1.5 / zoom")
+    parser.add_argument("--legacy", action="store_true", help="只运行与原实现的对比")
+    parser.add_argument("--precision", action="store_true", help="只运行 float64/float32 对比")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.legacy:
+        legacy_table()
+        return 0
+    if args.precision:
+        precision_table()
+        return 0
+
+    results = run_suite(args)
+    report = {"meta": metadata(), "results": results}
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    if args.record:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"\n基线已写入 {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"\n没有找到基线 {args.baseline}，请先用 --record 记录")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())["results"]
+    regressions = compare(results, baseline, args.threshold, args.rss_threshold)
+    if not regressions:
+        print(f"\n没有超过阈值的回归（墙钟时间阈值 {args.threshold:.0%}）")
+        return 0
+    print(f"\n发现 {len(regressions)} 项回归:")
+    for key, metric, base, now in regressions:
+        print(f"  {key} {metric}: {base:.4g} -> {now:.4g} ({now / base - 1:+.0%})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
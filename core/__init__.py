@@ -0,0 +1 @@
+"""各页面共享的计算模块"""
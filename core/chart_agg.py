@@ -0,0 +1,119 @@
+"""
+图表服务端聚合
+
+px.histogram / px.box / px.scatter 会把每一行都序列化成 JSON 发给浏览器，行数一多页面就卡死。
+这里在服务端先用 numpy 聚合：直方图只发送各箱计数，箱型图只发送四分位数和须线（外加有限个离群点），
+散点图超过点数阈值时改为抽样或二维密度图。发送的数据量与行数无关。
+"""
+import numpy as np
+import plotly.graph_objects as go
+
+# 散点图直接绘制的最大点数
+MAX_POINTS = 20_000
+# 箱型图最多绘制的离群点数
+MAX_OUTLIERS = 1_000
+
+
+def column_values(series):
+    """取出一列的有限值（float64）"""
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    return values[np.isfinite(values)]
+
+
+def pair_values(df, x_column, y_column):
+    """取出两列都为有限值的行，返回 (x, y)"""
+    pairs = df[[x_column, y_column]].to_numpy(dtype=np.float64, na_value=np.nan)
+    pairs = pairs[np.isfinite(pairs).all(axis=1)]
+    return pairs[:, 0], pairs[:, 1]
+
+
+def payload_bytes(fig):
+    """图表发送到浏览器的 JSON 字节数"""
+    return len(fig.to_json().encode())
+
+
+def estimate_raw_bytes(build, df, total_rows=None, head_rows=2_000):
+    """
+    估算逐行绘制时的载荷：用前 head_rows 行构建原图表，再按行数等比例放大
+    :param build: build(df) 返回逐行绘制的 plotly 图表
+    :param total_rows: 总行数，df 只是前几行时传入
+    """
+    total_rows = len(df) if total_rows is None else total_rows
+    head = df.iloc[:head_rows]
+    if len(head) == 0:
+        return 0
+    return int(payload_bytes(build(head)) * total_rows / len(head))
+
+
+def histogram_figure(values, column, bins=50, counts=None, edges=None):
+    """
+    预先分箱的直方图
+    :param counts: 已有的分箱计数（如近似统计的直方图），与 edges 一起传入时不再扫描 values
+    """
+    if counts is None:
+        counts, edges = np.histogram(values, bins=bins)
+    fig = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges)))
+    fig.update_layout(xaxis_title=column, yaxis_title="count", bargap=0)
+    return fig
+
+
+def box_stats(values, quartiles=None):
+    """
+    箱型图的统计量，须线取 1.5 倍四分位距内最远的数据点（与 plotly 默认相同）
+    :param quartiles: 已知的 (q1, median, q3)，不传时由 values 计算
+    :return: dict(q1, median, q3, lowerfence, upperfence, outliers)
+    """
+    if quartiles is None:
+        quartiles = np.quantile(values, [0.25, 0.5, 0.75])
+    q1, median, q3 = quartiles
+    iqr = q3 - q1
+    inside = (values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)
+    outliers = values[~inside]
+    return {
+        "q1": q1,
+        "median": median,
+        "q3": q3,
+        "lowerfence": values[inside].min() if inside.any() else q1,
+        "upperfence": values[inside].max() if inside.any() else q3,
+        "outliers": outliers,
+    }
+
+
+def box_figure(values, column, quartiles=None, max_outliers=MAX_OUTLIERS):
+    """
+    由预先计算的统计量绘制箱型图
+    离群点多于 max_outliers 时按排序后等间隔取点（保留最小和最大值）。
+    """
+    stats = box_stats(values, quartiles)
+    outliers = np.sort(stats.pop("outliers"))
+    if outliers.size > max_outliers:
+        outliers = outliers[np.linspace(0, outliers.size - 1, max_outliers).astype(np.intp)]
+
+    fig = go.Figure(go.Box(
+        q1=[stats["q1"]], median=[stats["median"]], q3=[stats["q3"]],
+        lowerfence=[stats["lowerfence"]], upperfence=[stats["upperfence"]],
+        x=[column], name=column, boxpoints=False,
+    ))
+    if outliers.size:
+        fig.add_trace(go.Scatter(x=np.full(outliers.size, column, dtype=object), y=outliers,
+                                 mode="markers", name="outliers", showlegend=False))
+    fig.update_layout(yaxis_title=column)
+    return fig
+
+
+def sample_rows(df, max_points=MAX_POINTS, seed=0):
+    """不放回地随机抽取 max_points 行，保持原有顺序"""
+    if len(df) <= max_points:
+        return df
+    rng = np.random.default_rng(seed)
+    return df.iloc[np.sort(rng.choice(len(df), max_points, replace=False))]
+
+
+def density_figure(x, y, x_column, y_column, bins=200):
+    """二维直方图密度图，空格子透明"""
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins)
+    z = np.where(counts > 0, counts, np.nan).T
+    fig = go.Figure(go.Heatmap(x=(x_edges[:-1] + x_edges[1:]) / 2, y=(y_edges[:-1] + y_edges[1:]) / 2,
+                               z=z, colorscale="Viridis", colorbar={"title": "count"}))
+    fig.update_layout(xaxis_title=x_column, yaxis_title=y_column)
+    return fig
@@ -0,0 +1,87 @@
+"""
+相关系数矩阵
+
+df.corr() 对每一对列分别计算，列数为 k 时是 O(n·k²) 的 Python 级循环。
+这里把数值列标准化后用一次矩阵乘法得到整张矩阵（可用 float32，BLAS 多线程）；
+有缺失值时按 pandas 的成对删除规则，用掩码矩阵的乘法得到每对列共同的有效行上的各项和。
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from core.colormap import matplotlib_palette, render_png
+from core.profile import numeric_matrix
+
+
+def correlation_matrix(df, columns, dtype=np.float32):
+    """
+    皮尔逊相关系数矩阵，结果与 df[columns].corr() 一致（float32 时误差约 1e-6）
+    :param dtype: 计算精度，np.float32 或 np.float64
+    :return: DataFrame
+    """
+    values = numeric_matrix(df, columns)
+    valid = ~np.isnan(values)
+    # 先按列中心化，减小求和时的抵消误差
+    with np.errstate(invalid="ignore", divide="ignore"):
+        values -= np.nanmean(values, axis=0)
+
+    if valid.all():
+        std = values.std(axis=0, ddof=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z = (values / std).astype(dtype)
+        corr = (z.T @ z).astype(np.float64) / (len(values) - 1)
+    else:
+        x = np.where(valid, values, 0).astype(dtype)
+        mask = valid.astype(dtype)
+        n = mask.T @ mask                  # 每对列共同的有效行数
+        sx = x.T @ mask                    # sx[i, j]: 列 i 在列 j 也有效的行上的和
+        sxx = (x * x).T @ mask
+        sxy = x.T @ x
+        n, sx, sxx, sxy = (a.astype(np.float64) for a in (n, sx, sxx, sxy))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = n * sxy - sx * sx.T
+            var = (n * sxx - sx * sx) * (n * sxx.T - sx.T * sx.T)
+            corr = cov / np.sqrt(var)
+        corr[n < 2] = np.nan
+
+    np.clip(corr, -1, 1, out=corr)
+    with warnings.catch_warnings():
+        # 全为缺失值的列
+        warnings.simplefilter("ignore", RuntimeWarning)
+        constant = ~(np.nanstd(values, axis=0) > 0)
+    corr[constant, :] = np.nan
+    corr[:, constant] = np.nan
+    # 对角线与 pandas 一样为 1（常数列除外）
+    diagonal = np.where(constant, np.nan, 1.0)
+    np.fill_diagonal(corr, diagonal)
+    return pd.DataFrame(corr, index=columns, columns=columns)
+
+
+def top_pairs(corr, k=20):
+    """
+    相关性最强的 k 对列（按绝对值）
+    :return: DataFrame[列1, 列2, 相关系数]
+    """
+    values = corr.to_numpy()
+    i, j = np.triu_indices(len(values), k=1)
+    r = values[i, j]
+    keep = ~np.isnan(r)
+    i, j, r = i[keep], j[keep], r[keep]
+    order = np.argsort(-np.abs(r), kind="stable")[:k]
+    return pd.DataFrame({
+        "列1": corr.index[i[order]],
+        "列2": corr.columns[j[order]],
+        "相关系数": r[order],
+    })
+
+
+def heatmap_png(corr, cmap="coolwarm", size=600):
+    """
+    把相关系数矩阵渲染为调色板 PNG，不绘制坐标轴和注释，列很多时也只需一次编码
+    每个格子放大为整数个像素，图像边长约为 size。
+    """
+    values = np.nan_to_num(corr.to_numpy(), nan=0.0)
+    cell = max(size // max(len(values), 1), 1)
+    values = np.repeat(np.repeat(values, cell, axis=0), cell, axis=1)
+    return render_png(values, matplotlib_palette(cmap), vmin=-1, vmax=1)
@@ -0,0 +1,159 @@
+"""
+分块流式读取 CSV
+
+按块读取大文件，每块单独推断并压缩 dtype（低基数字符串转 category，整数/浮点数降位宽），
+同时增量累计行数、缺失值和数值列的 count/mean/std/min/max，读完即可得到概览统计，
+不必再对整张表重新扫描。
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+DESCRIBE_INDEX = ["count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+
+
+class IngestCancelled(Exception):
+    """读取被取消"""
+
+
+class RunningStats:
+    """
+    增量列统计
+    数值列用 Chan 等人的并行算法合并每块的 (n, mean, M2)，在降位宽之前以 float64 计算，
+    结果与一次性读取的 df.describe() 一致（分位数除外，见 describe）。
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.columns = None
+        self.nulls = None
+        self.numeric = None
+        self.n = self.mean = self.m2 = self.min = self.max = None
+
+    def update(self, chunk):
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            self.nulls = pd.Series(0, index=chunk.columns, dtype=np.int64)
+            self.numeric = list(chunk.select_dtypes(include="number").columns)
+            k = len(self.numeric)
+            self.n = np.zeros(k)
+            self.mean = np.zeros(k)
+            self.m2 = np.zeros(k)
+            self.min = np.full(k, np.inf)
+            self.max = np.full(k, -np.inf)
+
+        self.rows += len(chunk)
+        self.nulls += chunk.isna().sum()
+
+        # 只要有一块不是数值类型，该列就不再算作数值列
+        still_numeric = [col for col in self.numeric if pd.api.types.is_numeric_dtype(chunk[col])]
+        if len(still_numeric) != len(self.numeric):
+            keep = [self.numeric.index(col) for col in still_numeric]
+            self.numeric = still_numeric
+            self.n, self.mean, self.m2 = self.n[keep], self.mean[keep], self.m2[keep]
+            self.min, self.max = self.min[keep], self.max[keep]
+        if not self.numeric:
+            return
+
+        values = chunk[self.numeric].to_numpy(dtype=np.float64)
+        n_b = np.sum(~np.isnan(values), axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_b = np.where(n_b > 0, np.nansum(values, axis=0) / np.maximum(n_b, 1), 0.0)
+            m2_b = np.nansum((values - mean_b) ** 2, axis=0)
+            self.min = np.fmin(self.min, np.nanmin(np.where(n_b > 0, values, np.inf), axis=0))
+            self.max = np.fmax(self.max, np.nanmax(np.where(n_b > 0, values, -np.inf), axis=0))
+
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.mean = np.where(n > 0, self.mean + delta * n_b / np.maximum(n, 1), 0.0)
+            self.m2 = self.m2 + m2_b + delta ** 2 * self.n * n_b / np.maximum(n, 1)
+        self.n = n
+
+    def null_counts(self):
+        return self.nulls.copy() if self.nulls is not None else pd.Series(dtype=np.int64)
+
+    def describe(self, df=None):
+        """
+        与 df.describe() 同格式的数值列统计
+        分位数无法精确地增量计算，传入读完的 df 时在其已压缩的列上补算，否则为 NaN。
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(self.m2 / (self.n - 1))
+        empty = self.n == 0
+        result = pd.DataFrame(
+            [self.n, np.where(empty, np.nan, self.mean), std,
+             np.where(empty, np.nan, self.min), np.full(len(self.numeric), np.nan),
+             np.full(len(self.numeric), np.nan), np.full(len(self.numeric), np.nan),
+             np.where(empty, np.nan, self.max)],
+            index=DESCRIBE_INDEX,
+            columns=self.numeric,
+        )
+        if df is not None and self.numeric:
+            result.loc[["25%", "50%", "75%"]] = df[self.numeric].quantile([0.25, 0.5, 0.75]).to_numpy()
+        return result
+
+
+def downcast_chunk(chunk, category_ratio=0.5, downcast_floats=True):
+    """
+    压缩一块数据的 dtype
+    :param category_ratio: 字符串列的不同值占比低于该值时转为 category
+    :param downcast_floats: 是否把 float64 降为 float32（会损失精度）
+    """
+    out = {}
+    for col in chunk.columns:
+        s = chunk[col]
+        if pd.api.types.is_integer_dtype(s):
+            s = pd.to_numeric(s, downcast="integer")
+        elif pd.api.types.is_float_dtype(s):
+            if downcast_floats:
+                s = pd.to_numeric(s, downcast="float")
+        elif (s.dtype == object or pd.api.types.is_string_dtype(s)) and len(s) \
+                and s.nunique(dropna=True) / len(s) < category_ratio:
+            s = s.astype("category")
+        out[col] = s
+    return pd.DataFrame(out)
+
+
+def concat_chunks(chunks):
+    """
+    拼接各块，category 列合并类别，其余列按 pandas 规则提升到共同类型
+    """
+    if not chunks:
+        return pd.DataFrame()
+    columns = {}
+    for col in chunks[0].columns:
+        parts = [chunk[col] for chunk in chunks]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            columns[col] = pd.Series(union_categoricals(parts), name=col)
+        else:
+            parts = [part.astype(object) if isinstance(part.dtype, pd.CategoricalDtype) else part
+                     for part in parts]
+            columns[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def read_csv_chunked(source, chunksize=100_000, total_bytes=None, on_progress=None,
+                     should_cancel=None, category_ratio=0.5, downcast_floats=True):
+    """
+    分块读取 CSV
+    :param source: 路径或文件对象
+    :param total_bytes: 文件总字节数，用于按已读字节估算进度
+    :param on_progress: 回调 on_progress(fraction, rows)，fraction 未知时为 None
+    :param should_cancel: 每块之前调用，返回 True 时抛出 IngestCancelled
+    :return: (DataFrame, RunningStats)
+    """
+    stats = RunningStats()
+    chunks = []
+    with pd.read_csv(source, chunksize=chunksize) as reader:
+        for chunk in reader:
+            if should_cancel is not None and should_cancel():
+                raise IngestCancelled()
+            stats.update(chunk)
+            chunks.append(downcast_chunk(chunk, category_ratio, downcast_floats))
+            if on_progress is not None:
+                fraction = None
+                if total_bytes and hasattr(source, "tell"):
+                    fraction = min(source.tell() / total_bytes, 1.0)
+                on_progress(fraction, stats.rows)
+    return concat_chunks(chunks), stats
@@ -0,0 +1,126 @@
+"""
+数据集加载缓存
+
+上传的文件按内容哈希作为键，本地文件按 路径+修改时间+大小 作为键，
+解析后的 DataFrame 常驻内存，按内存预算做 LRU 淘汰，切换图表列等交互不再重新解析文件。
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_key(data):
+    """上传文件内容的哈希"""
+    return "sha:" + hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_key(path):
+    """本地文件的 路径+修改时间+大小"""
+    st = os.stat(path)
+    return f"file:{os.path.abspath(path)}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def frame_nbytes(df):
+    """DataFrame 占用的内存（含 object 列中的字符串）"""
+    return int(df.memory_usage(deep=True).sum())
+
+
+class CachedDataset:
+    """
+    缓存中的一个数据集
+    artifacts 存放加载时顺带算出的结果（如分块读取累计的统计），随数据集一起淘汰。
+    """
+
+    def __init__(self, key, name, df, load_seconds, artifacts=None):
+        self.key = key
+        self.name = name
+        self.df = df
+        self.nbytes = frame_nbytes(df)
+        self.load_seconds = load_seconds
+        self.artifacts = artifacts or {}
+        self.hits = 0
+
+
+class DatasetCache:
+    """
+    按内存预算做 LRU 淘汰的数据集缓存
+    可在多个会话间共享，内部加锁。
+    """
+
+    def __init__(self, max_bytes=1024 ** 3):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def get(self, key):
+        """命中时返回 CachedDataset 并计数，否则返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.hits += 1
+                self.hits += 1
+            return entry
+
+    def get_or_load(self, key, loader, name=None):
+        """
+        取出缓存的数据集，未命中时调用 loader() 解析
+        loader 返回 DataFrame 或 (DataFrame, artifacts 字典)；返回 None 表示加载失败，结果不会被缓存。
+        :return: CachedDataset 或 None
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+
+        start = time.perf_counter()
+        result = loader()
+        if result is None:
+            return None
+        df, artifacts = result if isinstance(result, tuple) else (result, None)
+        entry = CachedDataset(key, name or key, df, time.perf_counter() - start, artifacts)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._evict()
+        return entry
+
+    def _evict(self):
+        total = self.nbytes
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, old = self._entries.popitem(last=False)
+            total -= old.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def totals(self):
+        """命中、未命中次数和总占用，在锁内读取，其他会话同时修改缓存时也是一致的快照"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "nbytes": self.nbytes}
+
+    def stats(self):
+        """各数据集的名称、行列数、大小、命中次数和首次加载耗时"""
+        with self._lock:
+            return [
+                {
+                    "name": entry.name,
+                    "rows": entry.df.shape[0],
+                    "columns": entry.df.shape[1],
+                    "MB": round(entry.nbytes / 2**20, 2),
+                    "hits": entry.hits,
+                    "load_s": round(entry.load_seconds, 3),
+                }
+                for entry in reversed(self._entries.values())
+            ]
@@ -0,0 +1,186 @@
+"""
+Excel 列式磁盘缓存
+
+每个工作表第一次读取时用 openpyxl 解析一次，转成 Arrow IPC（Feather v2，不压缩）文件，
+按文件内容哈希 + 工作表名存放。之后的会话和重跑直接内存映射读取，dtype 由 pandas 元数据还原。
+只解析被选中的工作表，其余工作表不会被读取。
+缓存目录总大小超过上限时，按最近使用时间（命中时更新文件修改时间）删除最早的工作表文件。
+未安装 pyarrow 时退化为每次直接解析。
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("STREAMLIT_APP_CACHE_DIR",
+                                        Path(tempfile.gettempdir()) / "streamlit_app_cache")) / "excel"
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def _open(source):
+    """source 可以是文件内容（bytes）或本地路径"""
+    return BytesIO(source) if isinstance(source, bytes) else source
+
+
+class ExcelCache:
+    """
+    Excel 工作表的 Arrow 磁盘缓存
+    :param cache_dir: 缓存目录，默认在系统临时目录下，可用 STREAMLIT_APP_CACHE_DIR 环境变量修改
+    :param max_bytes: 工作表文件的总大小上限
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=1024 ** 3):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return pa is not None
+
+    def _dir(self, key):
+        return self.cache_dir / _digest(key)
+
+    def sheet_names(self, source, key):
+        """
+        列出工作表名称，结果同样缓存在磁盘上
+        .xlsx 以只读模式打开，不解析任何单元格。
+        :param key: 数据来源的唯一键（如 content_key/file_key）
+        """
+        manifest = self._dir(key) / "sheets.json"
+        if manifest.exists():
+            return json.loads(manifest.read_text(encoding="utf-8"))
+
+        try:
+            from openpyxl import load_workbook
+            workbook = load_workbook(_open(source), read_only=True)
+            names = list(workbook.sheetnames)
+            workbook.close()
+        except Exception:
+            # .xls 等 openpyxl 不支持的格式
+            with pd.ExcelFile(_open(source)) as excel:
+                names = list(excel.sheet_names)
+
+        if self.enabled:
+            self._write_atomic(manifest, lambda path: path.write_text(json.dumps(names), encoding="utf-8"))
+        return names
+
+    def cached_path(self, key, sheet):
+        return self._dir(key) / f"{_digest(sheet)}.arrow"
+
+    def load_sheet(self, source, key, sheet):
+        """
+        读取一个工作表：命中磁盘缓存时内存映射读取，否则解析后写入缓存
+        含混合类型列等无法转成 Arrow 的工作表不写缓存，直接返回解析结果。
+        """
+        path = self.cached_path(key, sheet)
+        if self.enabled:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+            else:
+                return feather.read_table(path, memory_map=True).to_pandas()
+
+        df = pd.read_excel(_open(source), sheet_name=sheet)
+        if self.enabled:
+            try:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                return df
+            self._write_atomic(path, lambda tmp: feather.write_feather(table, tmp, compression="uncompressed"))
+            self.evict(keep=path)
+        return df
+
+    def _entries(self):
+        """[(修改时间, 大小, 路径)]，只统计工作表文件"""
+        entries = []
+        if not self.cache_dir.exists():
+            return entries
+        for folder in os.scandir(self.cache_dir):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if not entry.name.endswith(".arrow"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self, keep=None):
+        """删除最久未使用的工作表文件，直到总大小不超过上限；keep 为刚写入的文件，不会被删除"""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if path == str(keep):
+                    continue
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    # Windows 上仍被内存映射的文件无法删除，留到下次
+                    continue
+                total -= size
+                self.evictions += 1
+
+    def clear(self):
+        """删除所有缓存文件（包括工作表名称清单）"""
+        with self._lock:
+            if not self.cache_dir.exists():
+                return
+            for folder in os.scandir(self.cache_dir):
+                if not folder.is_dir():
+                    continue
+                for entry in os.scandir(folder.path):
+                    try:
+                        os.unlink(entry.path)
+                    except OSError:
+                        pass
+                try:
+                    os.rmdir(folder.path)
+                except OSError:
+                    pass
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            return {
+                "files": len(entries),
+                "MB": round(sum(size for _, size, _ in entries) / 2**20, 1),
+                "max_MB": round(self.max_bytes / 2**20),
+                "evictions": self.evictions,
+            }
+
+    def _write_atomic(self, path, write):
+        """先写临时文件再改名，避免并发会话读到写了一半的文件"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        os.close(fd)
+        try:
+            write(Path(tmp))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
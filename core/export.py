@@ -0,0 +1,181 @@
+"""
+数据导出
+
+在后台线程中分块写出 CSV、gzip 压缩的 CSV、Parquet 或 Excel 文件，页面只轮询进度，
+写完后把文件交给 st.download_button。每个会话有自己的临时目录，
+会话结束（session_state 被回收）时自动删除；进程异常退出留下的目录在下次创建时按时间清理。
+"""
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+EXPORT_ROOT = Path(os.environ.get("STREAMLIT_APP_CACHE_DIR",
+                                  Path(tempfile.gettempdir()) / "streamlit_app_cache")) / "exports"
+
+# 格式名称 -> (扩展名, MIME 类型)
+FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "CSV (gzip)": (".csv.gz", "application/gzip"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "Excel": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+EXCEL_MAX_ROWS = 1_048_575
+
+
+class ExportCancelled(Exception):
+    """导出被取消"""
+
+
+class ExportDir:
+    """
+    会话专属的导出目录，对象被回收时删除
+    :param max_age: 创建时顺带删除超过该秒数未修改的其他会话目录
+    """
+
+    def __init__(self, root=EXPORT_ROOT, max_age=24 * 3600):
+        root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        sweep_stale(root, max_age)
+        self._tmp = tempfile.TemporaryDirectory(dir=root, prefix="session-")
+        self.path = Path(self._tmp.name)
+
+    def file(self, name):
+        return self.path / name
+
+    def cleanup(self):
+        self._tmp.cleanup()
+
+
+def sweep_stale(root, max_age):
+    now = time.time()
+    for path in Path(root).glob("session-*"):
+        try:
+            if now - path.stat().st_mtime > max_age:
+                shutil.rmtree(path, ignore_errors=True)
+        except FileNotFoundError:
+            pass
+
+
+def _write_csv(df, path, chunk_rows, on_chunk, compress):
+    opener = (lambda: gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=6)) if compress \
+        else (lambda: open(path, "w", encoding="utf-8", newline=""))
+    with opener() as f:
+        for start in range(0, max(len(df), 1), chunk_rows):
+            chunk = df.iloc[start:start + chunk_rows]
+            chunk.to_csv(f, header=start == 0, index=False)
+            on_chunk(len(chunk))
+
+
+def _write_parquet(df, path, chunk_rows, on_chunk):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for start in range(0, max(len(df), 1), chunk_rows):
+            chunk = df.iloc[start:start + chunk_rows]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            on_chunk(len(chunk))
+
+
+def _excel_value(value):
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _write_excel(df, path, chunk_rows, on_chunk):
+    from openpyxl import Workbook
+
+    if len(df) > EXCEL_MAX_ROWS:
+        raise ValueError(f"Excel 工作表最多 {EXCEL_MAX_ROWS:,} 行，当前 {len(df):,} 行，请改用 CSV 或 Parquet")
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append([str(col) for col in df.columns])
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        for row in chunk.itertuples(index=False, name=None):
+            sheet.append([_excel_value(value) for value in row])
+        on_chunk(len(chunk))
+    workbook.save(path)
+
+
+class ExportJob:
+    """
+    后台导出任务
+    先写到同目录下的临时文件，完成后改名，因此 path 存在即表示文件完整。
+    :param fmt: FORMATS 中的格式名称
+    """
+
+    def __init__(self, df, fmt, path, chunk_rows=100_000):
+        self.df = df
+        self.fmt = fmt
+        self.path = Path(path)
+        self.chunk_rows = chunk_rows if fmt != "Excel" else min(chunk_rows, 10_000)
+        self.rows_written = 0
+        self.error = None
+        self.seconds = None
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def mime(self):
+        return FORMATS[self.fmt][1]
+
+    @property
+    def progress(self):
+        return self.rows_written / len(self.df) if len(self.df) else 1.0
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    @property
+    def done(self):
+        return not self.running and self.error is None and self.path.exists()
+
+    @property
+    def size(self):
+        return self.path.stat().st_size if self.path.exists() else 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _on_chunk(self, rows):
+        if self._cancel.is_set():
+            raise ExportCancelled()
+        self.rows_written += rows
+
+    def _run(self):
+        start = time.perf_counter()
+        tmp = self.path.with_name(self.path.name + ".part")
+        try:
+            if self.fmt in ("CSV", "CSV (gzip)"):
+                _write_csv(self.df, tmp, self.chunk_rows, self._on_chunk, compress=self.fmt == "CSV (gzip)")
+            elif self.fmt == "Parquet":
+                _write_parquet(self.df, tmp, self.chunk_rows, self._on_chunk)
+            elif self.fmt == "Excel":
+                _write_excel(self.df, tmp, self.chunk_rows, self._on_chunk)
+            else:
+                raise ValueError(f"未知的导出格式: {self.fmt}")
+            os.replace(tmp, self.path)
+        except Exception as e:
+            self.error = e
+            tmp.unlink(missing_ok=True)
+        finally:
+            self.seconds = time.perf_counter() - start
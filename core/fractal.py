@@ -0,0 +1,214 @@
+import numpy as np
+
+
+def complex_grid(h, w, x_min, x_max, y_min, y_max, dtype=np.complex128):
+    """
+    生成复平面网格（包含端点，与 np.ogrid[a:b:n*1j] 一致）
+    :param h: 高度
+    :param w: 宽度
+    :param dtype: 复数类型，complex64 时不会经过 complex128 中间数组
+    :return: 形状为 (h, w) 的复数数组
+    """
+    y, x = np.ogrid[y_min:y_max:h*1j, x_min:x_max:w*1j]
+    grid = np.empty((h, w), dtype=dtype)
+    grid.real = x
+    grid.imag = y
+    return grid
+
+
+def escape_time(z, c, max_iter):
+    """
+    逃逸时间迭代，只对尚未逃逸的像素继续计算
+    每次有像素逃逸时就压缩工作数组（z、c 和像素索引），
+    所以总代价与仍存活的像素数成正比，而不是 h*w*max_iter。
+    :param z: 初始 z，二维复数数组
+    :param c: 常数 c，可以是与 z 同形的数组（曼德勃罗特集）或标量（朱利亚集）
+    :param max_iter: 最大迭代次数
+    :return: 每个像素的逃逸迭代次数，未逃逸的像素为 max_iter
+    """
+    shape = z.shape
+    divtime = np.full(z.size, max_iter, dtype=int)
+    idx = np.arange(z.size)
+    z = z.ravel().copy()
+    per_pixel_c = np.ndim(c) > 0
+    if per_pixel_c:
+        c = np.broadcast_to(c, shape).ravel().copy()
+
+    for i in range(max_iter):
+        np.multiply(z, z, out=z)
+        z += c
+        diverge = z.real*z.real + z.imag*z.imag > 2**2
+        if diverge.any():
+            divtime[idx[diverge]] = i
+            alive = ~diverge
+            idx = idx[alive]
+            if idx.size == 0:
+                break
+            z = z[alive]
+            if per_pixel_c:
+                c = c[alive]
+
+    return divtime.reshape(shape)
+
+
+def escape_time_lean(z, c, max_iter):
+    """
+    省内存版逃逸时间迭代（float32，原地计算）
+    实部/虚部分别放在预分配的 float32 缓冲区中，全部用 out= 原地运算，迭代中不分配新数组。
+    逃逸的像素把 z、c 置零后留在原位（此后恒为 0，不会再逃逸），
+    死像素超过 1/4 时才借助一块临时缓冲区把存活像素原地压缩到各缓冲区前部。
+    :param z: 初始 z，二维复数数组
+    :param c: 常数 c，与 z 同形的数组或标量
+    :param max_iter: 最大迭代次数，不能超过 uint16 范围
+    :return: uint16 逃逸迭代次数矩阵
+    """
+    if max_iter > np.iinfo(np.uint16).max:
+        raise ValueError(f"max_iter 不能超过 {np.iinfo(np.uint16).max}")
+    shape = z.shape
+    n = z.size
+    divtime = np.full(n, max_iter, dtype=np.uint16)
+
+    # 依次为 zr, zi, cr, ci, zr^2, zi^2
+    planes = np.empty((6, n), dtype=np.float32)
+    planes[0] = z.real.ravel()
+    planes[1] = z.imag.ravel()
+    planes[2] = np.broadcast_to(np.real(c), shape).ravel()
+    planes[3] = np.broadcast_to(np.imag(c), shape).ravel()
+    np.multiply(planes[0], planes[0], out=planes[4])
+    np.multiply(planes[1], planes[1], out=planes[5])
+    idx = np.arange(n, dtype=np.int32)
+    # |z|^2 缓冲区，压缩时兼作临时区（int32 与 float32 等宽）
+    mag = np.empty(n, dtype=np.float32)
+    mask = np.empty(n, dtype=bool)
+    dead = np.zeros(n, dtype=bool)
+    size = live = n
+
+    for i in range(max_iter):
+        zr, zi, cr, ci, zr2, zi2 = planes[:, :size]
+        m, d = mask[:size], dead[:size]
+
+        # z = z^2 + c，zr^2、zi^2 沿用上一轮逃逸判断时的结果
+        zi *= zr
+        zi *= 2
+        zi += ci
+        np.subtract(zr2, zi2, out=zr)
+        zr += cr
+        np.multiply(zr, zr, out=zr2)
+        np.multiply(zi, zi, out=zi2)
+        np.add(zr2, zi2, out=mag[:size])
+        np.greater(mag[:size], 2**2, out=m)
+
+        escaped = np.count_nonzero(m)
+        if not escaped:
+            continue
+        divtime[idx[:size][m]] = i
+        for a in (zr, zi, cr, ci, zr2, zi2):
+            a[m] = 0
+        d |= m
+        live -= escaped
+        if live == 0:
+            break
+
+        if live < size * 3 // 4:
+            np.logical_not(d, out=m)
+            for plane in planes:
+                np.compress(m, plane[:size], out=mag[:live])
+                plane[:live] = mag[:live]
+            scratch = mag.view(np.int32)
+            np.compress(m, idx[:size], out=scratch[:live])
+            idx[:live] = scratch[:live]
+            dead[:live] = False
+            size = live
+
+    return divtime.reshape(shape)
+
+
+def mandelbrot(h, w, max_iter, x_min, x_max, y_min, y_max):
+    """
+    计算曼德勃罗特集
+    :param h: 高度
+    :param w: 宽度
+    :param max_iter: 最大迭代次数
+    :param x_min: x的最小值
+    :param x_max: x的最大值
+    :param y_min: y的最小值
+    :param y_max: y的最大值
+    :return: 逃逸迭代次数矩阵
+    """
+    c = complex_grid(h, w, x_min, x_max, y_min, y_max)
+    return escape_time(c, c, max_iter)
+
+
+def julia(h, w, max_iter, x_min, x_max, y_min, y_max, c):
+    """
+    计算朱利亚集
+    :param c: 朱利亚集参数
+    其余参数同 mandelbrot
+    """
+    z = complex_grid(h, w, x_min, x_max, y_min, y_max)
+    return escape_time(z, complex(c), max_iter)
+
+
+def mandelbrot_lean(h, w, max_iter, x_min, x_max, y_min, y_max):
+    """float32 原地计算版 mandelbrot，返回 uint16，参数同 mandelbrot"""
+    c = complex_grid(h, w, x_min, x_max, y_min, y_max, dtype=np.complex64)
+    return escape_time_lean(c, c, max_iter)
+
+
+def julia_lean(h, w, max_iter, x_min, x_max, y_min, y_max, c):
+    """float32 原地计算版 julia，返回 uint16，参数同 julia"""
+    z = complex_grid(h, w, x_min, x_max, y_min, y_max, dtype=np.complex64)
+    return escape_time_lean(z, complex(c), max_iter)
+
+
+# 批量计算时每组的像素数，工作数组保持在缓存可容纳的规模
+BATCH_PIXELS = 2**16
+
+
+def julia_batch(h, w, max_iter, x_min, x_max, y_min, y_max, cs, lean=False):
+    """
+    一次计算多个参数 c 的朱利亚集
+    把 c 堆叠在第三个维度上，每组约 BATCH_PIXELS 个像素共用一次压缩式迭代，
+    小缩略图时能省掉逐个调用的开销，大图时也不会让工作数组超出缓存。
+    :param cs: c 值序列
+    :param lean: 使用 float32 原地计算的 escape_time_lean
+    :return: (len(cs), h, w) 的逃逸迭代次数
+    """
+    cs = np.asarray(cs, dtype=complex)
+    grid = complex_grid(h, w, x_min, x_max, y_min, y_max)
+    kernel = escape_time_lean if lean else escape_time
+    out = np.empty((len(cs), h, w), dtype=np.uint16 if lean else int)
+    group = max(1, BATCH_PIXELS // (h * w))
+    for start in range(0, len(cs), group):
+        chunk = cs[start:start + group]
+        z = np.broadcast_to(grid, (len(chunk), h, w))
+        c = np.broadcast_to(chunk[:, np.newaxis, np.newaxis], z.shape)
+        out[start:start + len(chunk)] = kernel(z, c, max_iter)
+    return out
+
+
+def progressive(h, w, max_iter, x_min, x_max, y_min, y_max, c=None, steps=(8, 4, 2, 1),
+                lean=False):
+    """
+    由粗到细逐级计算分形，用于快速预览
+    第 k 级只计算全分辨率网格上 [::step, ::step] 的点，
+    前面各级已经算过的点（网格点重合）直接复用，不再重算。
+    :param c: 为 None 时计算曼德勃罗特集，否则计算朱利亚集
+    :param steps: 各级采样步长，最后一级应为 1
+    :param lean: 使用 float32 原地计算的 escape_time_lean
+    :return: 生成器，依次产出 (step, 该级的逃逸迭代次数矩阵)
+    """
+    grid = complex_grid(h, w, x_min, x_max, y_min, y_max)
+    out = np.empty((h, w), dtype=np.uint16 if lean else int)
+    known = np.zeros((h, w), dtype=bool)
+    kernel = escape_time_lean if lean else escape_time
+
+    for step in steps:
+        sub_out = out[::step, ::step]
+        sub_known = known[::step, ::step]
+        todo = ~sub_known
+        if todo.any():
+            z = grid[::step, ::step][todo]
+            sub_out[todo] = kernel(z, z if c is None else complex(c), max_iter)
+            sub_known[todo] = True
+        yield step, sub_out.copy()
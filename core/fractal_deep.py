@@ -0,0 +1,156 @@
+"""
+深度缩放用的高级曼德勃罗特内核
+
+- 主心形/周期 2 圆盘判定：这两块内部区域的像素直接判为不逃逸
+- 周期检测（Brent 法）：轨道回到之前保存的点附近即判为内部点，提前退出
+- 扰动法：用高精度计算中心点的参考轨道，各像素只用 float64 迭代与参考轨道的差值 δ，
+  深度缩放时不必逐像素使用任意精度；参考轨道失效时按 Zhuoran 的方法重新定基
+- 输出归一化的平滑迭代次数（float32），内部点为 max_iter
+"""
+import math
+from decimal import Decimal, localcontext
+
+import numpy as np
+
+from core.fractal import complex_grid
+
+# 平滑着色需要较大的逃逸半径，否则色带会有明显的台阶
+BAILOUT = 256.0
+
+# 像素间距小于该值时 float64 网格已不足以区分相邻像素，自动启用扰动法
+PERTURBATION_PIXEL_SIZE = 1e-12
+
+
+def interior_mask(c):
+    """主心形和周期 2 圆盘内的点（一定不会逃逸）"""
+    x, y = c.real, c.imag
+    xq = x - 0.25
+    q = xq*xq + y*y
+    cardioid = q * (q + xq) <= 0.25 * y*y
+    bulb = (x + 1)**2 + y*y <= 1 / 16
+    return cardioid | bulb
+
+
+def reference_orbit(cx, cy, max_iter, digits):
+    """
+    用 Decimal 高精度计算参考点的轨道 Z_0=0, Z_1=C, ...
+    轨道在逃逸时截断。
+    :param cx: 参考点实部（Decimal）
+    :param cy: 参考点虚部（Decimal）
+    :param digits: 十进制有效位数
+    :return: complex128 数组
+    """
+    orbit = [0j]
+    with localcontext() as ctx:
+        ctx.prec = digits
+        zr, zi = Decimal(0), Decimal(0)
+        limit = Decimal(BAILOUT) ** 2
+        for _ in range(max_iter + 1):
+            zr, zi = zr*zr - zi*zi + cx, 2*zr*zi + cy
+            orbit.append(complex(float(zr), float(zi)))
+            if zr*zr + zi*zi > limit:
+                break
+    return np.array(orbit)
+
+
+def _smooth(i, abs2, max_iter):
+    """由逃逸时的迭代序号和 |z|^2 计算平滑迭代次数"""
+    nu = i + 1 - np.log2(0.5 * np.log(abs2) / math.log(BAILOUT))
+    return np.clip(nu, 0, max_iter)
+
+
+def _iterate(c, max_iter, eps2, delta_c=None, orbit=None):
+    """
+    压缩式迭代，只保留活跃像素
+    delta_c 为 None 时直接迭代 z = z^2 + c；否则按扰动法迭代 δ，
+    像素的值为 orbit[m] + δ，m 为各像素当前所用的参考轨道下标。
+    :param eps2: 周期检测阈值的平方
+    :return: 展平后的 float32 平滑迭代次数
+    """
+    n = c.size
+    result = np.full(n, max_iter, dtype=np.float32)
+    idx = np.flatnonzero(~interior_mask(c))
+    perturb = delta_c is not None
+
+    if perturb:
+        dc = delta_c[idx]
+        delta = dc.copy()
+        m = np.ones(idx.size, dtype=np.intp)
+        z = orbit[m] + delta
+        last = len(orbit) - 1
+    else:
+        cc = c[idx]
+        z = cc.copy()
+    saved = z.copy()
+
+    for i in range(max_iter):
+        if perturb:
+            delta = (2*orbit[m] + delta) * delta + dc
+            m += 1
+            z = orbit[m] + delta
+        else:
+            z = z*z + cc
+        abs2 = z.real*z.real + z.imag*z.imag
+
+        escaped = abs2 > BAILOUT**2
+        if escaped.any():
+            result[idx[escaped]] = _smooth(i, abs2[escaped], max_iter)
+
+        # 周期检测：回到已保存点附近的像素为内部点
+        periodic = (z.real - saved.real)**2 + (z.imag - saved.imag)**2 < eps2
+        done = escaped | periodic
+        if done.any():
+            alive = ~done
+            idx = idx[alive]
+            if idx.size == 0:
+                break
+            z = z[alive]
+            saved = saved[alive]
+            if perturb:
+                delta, dc, m = delta[alive], dc[alive], m[alive]
+            else:
+                cc = cc[alive]
+
+        if perturb:
+            # 重新定基：|z| < |δ| 或参考轨道用完时，让 δ 从 Z_0 = 0 重新开始
+            d2 = delta.real*delta.real + delta.imag*delta.imag
+            rebase = (z.real*z.real + z.imag*z.imag < d2) | (m == last)
+            if rebase.any():
+                delta[rebase] = z[rebase]
+                m[rebase] = 0
+
+        # Brent 法：在 2 的幂次迭代时更新保存点
+        if i & (i + 1) == 0:
+            saved = z.copy()
+
+    return result
+
+
+def mandelbrot_smooth(h, w, max_iter, x_min, x_max, y_min, y_max,
+                      perturbation=None, periodicity=True):
+    """
+    计算平滑着色的曼德勃罗特集
+    参数含义与 core.fractal.mandelbrot 相同。
+    :param perturbation: 是否使用扰动法，None 表示按像素间距自动决定
+    :param periodicity: 是否启用周期检测
+    :return: (h, w) 的 float32 平滑迭代次数，内部点为 max_iter
+    """
+    pixel = min((x_max - x_min) / max(w - 1, 1), (y_max - y_min) / max(h - 1, 1))
+    eps2 = (pixel * 1e-3) ** 2 if periodicity else -1.0
+    if perturbation is None:
+        perturbation = pixel < PERTURBATION_PIXEL_SIZE
+
+    c = complex_grid(h, w, x_min, x_max, y_min, y_max).ravel()
+    if not perturbation:
+        return _iterate(c, max_iter, eps2).reshape(h, w)
+
+    # 参考点取视窗中心，精度随缩放深度增加
+    cx = (Decimal(x_min) + Decimal(x_max)) / 2
+    cy = (Decimal(y_min) + Decimal(y_max)) / 2
+    digits = max(20, int(-math.log10(pixel)) + 10)
+    orbit = reference_orbit(cx, cy, max_iter, digits)
+
+    dx = np.linspace(-(x_max - x_min) / 2, (x_max - x_min) / 2, w)
+    dy = np.linspace(-(y_max - y_min) / 2, (y_max - y_min) / 2, h)
+    delta_c = (dx[np.newaxis, :] + dy[:, np.newaxis]*1j).ravel()
+    return _iterate(c, max_iter, eps2, delta_c, orbit).reshape(h, w)
@@ -0,0 +1,203 @@
+"""
+多进程分块渲染
+
+把复平面按行切成若干块，交给常驻的进程池计算。
+结果由子进程直接写入共享内存，不经过 pickle 回传整块数组。
+进程池不可用（启动失败或有子进程异常退出）时退回本进程计算，下次调用重建进程池。
+"""
+import atexit
+import multiprocessing
+import os
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from core.fractal import (BATCH_PIXELS, escape_time, escape_time_lean, julia, julia_batch,
+                          julia_lean, mandelbrot, mandelbrot_lean)
+
+# 每个进程分到的块数，块越多负载越均衡（集合内部的行比外部慢得多）
+TILES_PER_WORKER = 4
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+@contextmanager
+def _bare_main():
+    """
+    启动子进程期间把 __main__ 换成没有 __file__ 的空模块
+    spawn 的子进程会以 __mp_main__ 的身份重新执行父进程 __main__ 对应的文件；
+    Streamlit 把 __main__ 设成当前页面脚本，不替换的话每个子进程都会把页面再跑一遍。
+    """
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+def get_pool(max_workers=None):
+    """
+    获取常驻进程池，首次调用或原进程池已损坏时创建
+    使用 spawn 启动方式，避免在 Streamlit 的多线程服务进程里 fork。
+    进程池在所有会话间共享，不会因为 max_workers 不同而重建（重建会取消其他会话正在进行的渲染）；
+    实际进程数见 pool_workers()。
+    :param max_workers: 创建时的进程数，默认等于 CPU 核数
+    :raises BrokenProcessPool: 子进程启动失败
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None and not _pool._broken:
+            return _pool
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        workers = max_workers or os.cpu_count() or 1
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        # spawn 方式下子进程在第一次 submit 时全部启动，在这里预热，保证启动时 __main__ 已替换
+        try:
+            with _bare_main():
+                pool.submit(os.getpid).result()
+        except BrokenProcessPool:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        _pool, _pool_workers = pool, workers
+        return _pool
+
+
+def pool_workers():
+    """进程池的进程数，尚未创建时为 0"""
+    with _pool_lock:
+        return _pool_workers
+
+
+def shutdown_pool():
+    """关闭进程池"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool, _pool_workers = None, 0
+
+
+atexit.register(shutdown_pool)
+
+
+def _render_rows(shm_name, shape, row_start, row_stop, max_iter,
+                 x_min, x_max, y_min, y_max, julia_c, lean):
+    """子进程：计算 [row_start, row_stop) 行并写入共享内存"""
+    h, w = shape
+    ys = np.linspace(y_min, y_max, h)[row_start:row_stop]
+    xs = np.linspace(x_min, x_max, w)
+    z = xs[np.newaxis, :] + ys[:, np.newaxis]*1j
+    c = z if julia_c is None else julia_c
+    kernel = escape_time_lean if lean else escape_time
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=np.uint16 if lean else np.int64, buffer=shm.buf)
+        out[row_start:row_stop] = kernel(z, c, max_iter)
+        del out
+    finally:
+        shm.close()
+
+
+def render_tiled(h, w, max_iter, x_min, x_max, y_min, y_max,
+                 julia_c=None, max_workers=None, lean=False):
+    """
+    多进程分块计算逃逸时间
+    :param julia_c: 为 None 时计算曼德勃罗特集，否则计算以其为参数的朱利亚集
+    :param max_workers: 进程池尚未创建时使用的进程数，见 get_pool
+    :param lean: 使用 float32 原地计算的 escape_time_lean，结果为 uint16
+    :return: 与 core.fractal.mandelbrot/julia 相同的逃逸迭代次数矩阵
+    """
+    dtype = np.dtype(np.uint16 if lean else np.int64)
+    if julia_c is not None:
+        julia_c = complex(julia_c)
+    try:
+        pool = get_pool(max_workers)
+        n_tiles = min(h, pool_workers() * TILES_PER_WORKER)
+        bounds = np.linspace(0, h, n_tiles + 1).astype(int)
+
+        shm = shared_memory.SharedMemory(create=True, size=h * w * dtype.itemsize)
+        try:
+            futures = [
+                pool.submit(_render_rows, shm.name, (h, w), int(r0), int(r1), max_iter,
+                            x_min, x_max, y_min, y_max, julia_c, lean)
+                for r0, r1 in zip(bounds[:-1], bounds[1:]) if r1 > r0
+            ]
+            wait(futures)
+            for future in futures:
+                future.result()
+            return np.ndarray((h, w), dtype=dtype, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+    except BrokenProcessPool:
+        if julia_c is None:
+            return (mandelbrot_lean if lean else mandelbrot)(h, w, max_iter, x_min, x_max, y_min, y_max)
+        return (julia_lean if lean else julia)(h, w, max_iter, x_min, x_max, y_min, y_max, julia_c)
+
+
+def mandelbrot_tiled(h, w, max_iter, x_min, x_max, y_min, y_max, lean=False):
+    """多进程版 mandelbrot，参数与 core.fractal.mandelbrot 相同"""
+    return render_tiled(h, w, max_iter, x_min, x_max, y_min, y_max, lean=lean)
+
+
+def julia_tiled(h, w, max_iter, x_min, x_max, y_min, y_max, c, lean=False):
+    """多进程版 julia，参数与 core.fractal.julia 相同"""
+    return render_tiled(h, w, max_iter, x_min, x_max, y_min, y_max, julia_c=c, lean=lean)
+
+
+def _render_julia_batch(shm_name, shape, start, cs, max_iter, x_min, x_max, y_min, y_max, lean):
+    """子进程：计算一组 c 的朱利亚集，写入共享内存中 [start, start+len(cs)) 的位置"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=np.uint16 if lean else np.int64, buffer=shm.buf)
+        _, h, w = shape
+        out[start:start + len(cs)] = julia_batch(h, w, max_iter, x_min, x_max, y_min, y_max, cs, lean)
+        del out
+    finally:
+        shm.close()
+
+
+def julia_batch_tiled(h, w, max_iter, x_min, x_max, y_min, y_max, cs, lean=False, max_workers=None):
+    """
+    多进程版 julia_batch，按 c 分组交给进程池
+    :return: (len(cs), h, w) 的逃逸迭代次数
+    """
+    cs = [complex(c) for c in cs]
+    shape = (len(cs), h, w)
+    dtype = np.dtype(np.uint16 if lean else np.int64)
+    try:
+        pool = get_pool(max_workers)
+        # 每个进程至少分到一组，组内像素数不超过 BATCH_PIXELS
+        group = max(1, min(BATCH_PIXELS // (h * w), -(-len(cs) // pool_workers())))
+
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(cs) * h * w * dtype.itemsize))
+        try:
+            futures = [
+                pool.submit(_render_julia_batch, shm.name, shape, start, cs[start:start + group],
+                            max_iter, x_min, x_max, y_min, y_max, lean)
+                for start in range(0, len(cs), group)
+            ]
+            wait(futures)
+            for future in futures:
+                future.result()
+            return np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+    except BrokenProcessPool:
+        return julia_batch(h, w, max_iter, x_min, x_max, y_min, y_max, cs, lean)
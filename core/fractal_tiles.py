@@ -0,0 +1,126 @@
+"""
+视窗瓦片缓存
+
+类似地图瓦片金字塔：第 level 级把复平面切成边长 BASE_SPAN / 2**level 的正方形瓦片，
+每块瓦片固定 TILE_SIZE x TILE_SIZE 个采样点。视窗由覆盖它的瓦片拼接后最近邻采样得到，
+平移、回到看过的区域时只需计算缺失的瓦片。
+"""
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from core.fractal import escape_time
+
+TILE_SIZE = 128
+BASE_SPAN = 4.0
+
+
+class TileCache:
+    """
+    按 (分形类型, level, tx, ty, max_iter, c) 缓存瓦片，按字节数做 LRU 淘汰
+    可在多个会话间共享，内部加锁。
+    """
+
+    def __init__(self, max_bytes=256 * 1024 ** 2, tile_size=TILE_SIZE):
+        self.max_bytes = max_bytes
+        self.tile_size = tile_size
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def stats(self):
+        """返回命中/未命中次数、瓦片数和占用字节数"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "tiles": len(self._tiles),
+                "bytes": self.nbytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def level_for(self, pixel_size):
+        """选择采样间距不大于视窗像素间距的最粗一级"""
+        base_pixel = BASE_SPAN / self.tile_size
+        return max(0, math.ceil(math.log2(base_pixel / pixel_size)))
+
+    def render(self, h, w, max_iter, x_min, x_max, y_min, y_max, c=None):
+        """
+        用缓存瓦片拼出视窗
+        :param c: 为 None 时为曼德勃罗特集，否则为朱利亚集参数
+        :return: (h, w) 的逃逸迭代次数矩阵（最近邻采样，是直接计算的近似，集合边界附近会有部分像素不同）
+        """
+        pixel_size = min((x_max - x_min) / max(w - 1, 1), (y_max - y_min) / max(h - 1, 1))
+        level = self.level_for(pixel_size)
+        step = BASE_SPAN / self.tile_size / 2 ** level
+        t = self.tile_size
+
+        # 视窗像素 -> 该级全局采样点编号
+        gx = np.rint(np.linspace(x_min, x_max, w) / step).astype(np.int64)
+        gy = np.rint(np.linspace(y_min, y_max, h) / step).astype(np.int64)
+        tx0, tx1 = gx.min() // t, gx.max() // t
+        ty0, ty1 = gy.min() // t, gy.max() // t
+
+        kind = "mandelbrot" if c is None else "julia"
+        c_key = None if c is None else complex(c)
+        coords = [(tx, ty) for ty in range(ty0, ty1 + 1) for tx in range(tx0, tx1 + 1)]
+        keys = {xy: (kind, level, xy[0], xy[1], max_iter, c_key) for xy in coords}
+
+        found = {}
+        with self._lock:
+            for xy, key in keys.items():
+                tile = self._tiles.get(key)
+                if tile is not None:
+                    self._tiles.move_to_end(key)
+                    found[xy] = tile
+            self.hits += len(found)
+            self.misses += len(coords) - len(found)
+
+        missing = [xy for xy in coords if xy not in found]
+        if missing:
+            computed = self._compute(missing, step, max_iter, c_key)
+            with self._lock:
+                for xy, tile in zip(missing, computed):
+                    self._put(keys[xy], tile)
+                    found[xy] = tile
+
+        dtype = next(iter(found.values())).dtype
+        mosaic = np.empty(((ty1 - ty0 + 1) * t, (tx1 - tx0 + 1) * t), dtype=dtype)
+        for (tx, ty), tile in found.items():
+            r, col = (ty - ty0) * t, (tx - tx0) * t
+            mosaic[r:r + t, col:col + t] = tile
+        return mosaic[np.ix_(gy - ty0 * t, gx - tx0 * t)]
+
+    def _compute(self, coords, step, max_iter, c):
+        """把所有缺失的瓦片堆叠后一次性计算"""
+        t = self.tile_size
+        offsets = np.arange(t)
+        tx = np.array([xy[0] for xy in coords])[:, None, None]
+        ty = np.array([xy[1] for xy in coords])[:, None, None]
+        x = (tx * t + offsets[None, None, :]) * step
+        y = (ty * t + offsets[None, :, None]) * step
+        z = x + y*1j
+        divtime = escape_time(z, z if c is None else c, max_iter)
+        return list(divtime.astype(np.min_scalar_type(max_iter)))
+
+    def _put(self, key, tile):
+        if key in self._tiles:
+            return
+        self._tiles[key] = tile
+        self.nbytes += tile.nbytes
+        while self.nbytes > self.max_bytes and len(self._tiles) > 1:
+            _, old = self._tiles.popitem(last=False)
+            self.nbytes -= old.nbytes
@@ -0,0 +1,125 @@
+"""
+动画帧流水线
+
+后台线程提前渲染后续帧放入有界队列，页面线程按目标帧率取帧显示。
+计算跟不上时丢帧而不是卡住：已经错过显示时间的帧不再渲染或显示。
+"""
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class FramePipeline:
+    """
+    生产者/消费者帧流水线
+    用法:
+        with FramePipeline(render, params, target_fps=10) as pipeline:
+            for index, param, frame in pipeline.frames():
+                placeholder.image(frame)
+    :param render: 渲染函数 render(param) -> frame，在后台线程中调用，不能调用 st.*
+    :param params: 每帧参数的可迭代对象，可以是无限序列
+    :param target_fps: 目标帧率
+    :param queue_size: 预渲染队列长度
+    """
+
+    def __init__(self, render, params, target_fps=10, queue_size=8):
+        self.render = render
+        self.params = params
+        self.target_fps = target_fps
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.shown = 0
+        self.dropped = 0
+        self.error = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._start_time = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def stats(self):
+        """返回实际帧率、队列深度、已显示和丢弃的帧数"""
+        elapsed = time.perf_counter() - self._start_time if self._start_time else 0
+        with self._lock:
+            return {
+                "fps": self.shown / elapsed if elapsed > 0 else 0.0,
+                "queue_depth": self.queue.qsize(),
+                "shown": self.shown,
+                "dropped": self.dropped,
+            }
+
+    def _deadline(self, index):
+        return self._start_time + index / self.target_fps
+
+    def _drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        try:
+            for index, param in enumerate(self.params):
+                if self._stop.is_set():
+                    return
+                # 渲染完也赶不上显示时间的帧直接跳过
+                if time.perf_counter() > self._deadline(index + 1):
+                    self._drop()
+                    continue
+                if not self._put((index, param, self.render(param))):
+                    return
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(_DONE)
+
+    def _has_newer(self):
+        with self.queue.mutex:
+            return bool(self.queue.queue) and self.queue.queue[0] is not _DONE
+
+    def frames(self):
+        """
+        按目标帧率产出 (index, param, frame)
+        后台渲染出错时在这里重新抛出。
+        """
+        while True:
+            item = self.queue.get()
+            if item is _DONE:
+                if self.error is not None:
+                    raise self.error
+                return
+            index, param, frame = item
+            now = time.perf_counter()
+            if now > self._deadline(index + 1) and self._has_newer():
+                self._drop()
+                continue
+            delay = self._deadline(index) - now
+            if delay > 0:
+                time.sleep(delay)
+            with self._lock:
+                self.shown += 1
+            yield index, param, frame
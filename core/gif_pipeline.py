@@ -0,0 +1,231 @@
+"""
+GIF 逐帧处理流水线
+
+GIF 的帧依赖前一帧（局部更新、调色板），只能顺序解码；抠图推理则各帧独立。
+这里在主线程顺序解码，同时把已解码的帧交给线程池推理（onnxruntime 推理时释放 GIL），
+在途帧数有上限；结果按原顺序收集，每帧的持续时间原样保留。
+
+很多 GIF 有大段相同或几乎相同的帧。解码时先给每帧算哈希：与之前某帧完全相同、
+或与上一个推理帧的感知哈希足够接近时直接复用其掩码，不再推理；
+可选地，与上一帧只有小块区域不同时只对变化区域推理，再贴回上一帧的掩码。
+"""
+import hashlib
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from core.rembg_session import cutout
+
+
+def frame_count(gif):
+    return getattr(gif, "n_frames", 1)
+
+
+def gif_frames(gif):
+    """
+    逐帧解码为 RGBA
+    :return: 生成器，yield (帧, 持续时间毫秒)
+    """
+    for i in range(frame_count(gif)):
+        gif.seek(i)
+        frame = Image.new("RGBA", gif.size, (0, 0, 0, 0))
+        frame.paste(gif)
+        yield frame, gif.info.get("duration", 100)
+
+
+def map_ordered(fn, items, max_workers=None, max_pending=None, on_result=None):
+    """
+    并行执行 fn(item)，结果按 items 的顺序返回
+    items 惰性读取，最多 max_pending 个在途，读取下一个 item（如解码下一帧）与推理同时进行。
+    :param on_result: 每得到一个结果调用 on_result(已完成数)，在调用线程中执行
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * max_workers
+    results = []
+
+    def collect(future):
+        results.append(future.result())
+        if on_result is not None:
+            on_result(len(results))
+
+    with ThreadPoolExecutor(max_workers) as pool:
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(pool.submit(fn, item))
+                while len(pending) >= max_pending:
+                    collect(pending.popleft())
+            while pending:
+                collect(pending.popleft())
+        finally:
+            for future in pending:
+                future.cancel()
+    return results
+
+
+def dhash(image, size=8):
+    """差值哈希：缩成 (size+1)×size 的灰度图，比较相邻像素的明暗，得到 size² 位整数"""
+    pixels = np.asarray(image.convert("L").resize((size + 1, size), Image.Resampling.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def changed_box(previous, current, pad=16):
+    """
+    两帧像素不同的外接矩形，向外扩展 pad 像素
+    :return: (left, top, right, bottom)，两帧相同时为 None
+    """
+    diff = np.any(previous != current, axis=2)
+    rows = np.flatnonzero(diff.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(diff.any(axis=0))
+    height, width = diff.shape
+    return (max(int(cols[0]) - pad, 0), max(int(rows[0]) - pad, 0),
+            min(int(cols[-1]) + 1 + pad, width), min(int(rows[-1]) + 1 + pad, height))
+
+
+class FramePlan:
+    """
+    一帧的处理方式
+    kind 为 full（整帧推理）、exact / similar（复用 source 帧的掩码）
+    或 delta（只对 box 区域推理，贴到 source 帧的掩码上）。
+    """
+
+    def __init__(self, index, frame, duration, kind="full", source=None, box=None):
+        self.index = index
+        self.frame = frame
+        self.duration = duration
+        self.kind = kind
+        self.source = source
+        self.box = box
+
+    @property
+    def image(self):
+        """需要推理的图像，复用掩码时为 None"""
+        if self.kind == "full":
+            return self.frame
+        if self.kind == "delta":
+            return self.frame.crop(self.box)
+        return None
+
+
+def plan_frames(gif, threshold=None, delta_area=0.0, pad=16):
+    """
+    解码并决定每帧的处理方式
+    :param threshold: 感知哈希（64 位）的汉明距离阈值，不超过阈值即复用上一个推理帧的掩码；None 表示只复用完全相同的帧
+    :param delta_area: 与上一帧的变化区域不超过整帧面积的该比例时只对变化区域推理，0 表示不启用
+    :return: 生成器，yield FramePlan
+    """
+    seen = {}
+    key_hash = key_index = None
+    previous = None
+    for index, (frame, duration) in enumerate(gif_frames(gif)):
+        pixels = np.asarray(frame)
+        digest = hashlib.blake2b(pixels.tobytes(), digest_size=16).digest()
+        if digest in seen:
+            plan = FramePlan(index, frame, duration, "exact", seen[digest])
+        else:
+            seen[digest] = index
+            fingerprint = dhash(frame) if threshold is not None else None
+            if key_hash is not None and hamming(fingerprint, key_hash) <= threshold:
+                plan = FramePlan(index, frame, duration, "similar", key_index)
+            else:
+                box = changed_box(previous, pixels, pad) if delta_area and previous is not None else None
+                if box is not None and (box[2] - box[0]) * (box[3] - box[1]) <= delta_area * pixels.shape[0] * pixels.shape[1]:
+                    plan = FramePlan(index, frame, duration, "delta", index - 1, box)
+                else:
+                    plan = FramePlan(index, frame, duration)
+                key_hash, key_index = fingerprint, index
+        previous = pixels
+        yield plan
+
+
+class FrameStats:
+    """处理进度、吞吐量以及各处理方式的帧数"""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.start = time.perf_counter()
+        self.seconds = 0.0
+        self.kinds = Counter()
+
+    def update(self, done):
+        self.done = done
+        self.seconds = time.perf_counter() - self.start
+
+    @property
+    def progress(self):
+        return min(self.done / self.total, 1.0) if self.total else 1.0
+
+    @property
+    def fps(self):
+        return self.done / self.seconds if self.seconds else 0.0
+
+    @property
+    def inferences(self):
+        """实际推理的次数（整帧和局部）"""
+        return self.kinds["full"] + self.kinds["delta"]
+
+    @property
+    def saved(self):
+        """复用掩码而省去的推理次数"""
+        return self.kinds["exact"] + self.kinds["similar"]
+
+
+def remove_gif_background(gif, mask, max_workers=None, on_progress=None, threshold=None, delta_area=0.0):
+    """
+    对 GIF 的每一帧移除背景
+    :param mask: mask(image) 返回前景掩码（L 模式）
+    :param threshold: 近似重复帧的感知哈希阈值，见 plan_frames
+    :param delta_area: 局部推理的面积比例上限，见 plan_frames
+    :param on_progress: on_progress(FrameStats)，每完成一帧调用一次
+    :return: (帧列表, 持续时间列表, FrameStats)
+    """
+    stats = FrameStats(frame_count(gif))
+    plans = []
+
+    def tasks():
+        for plan in plan_frames(gif, threshold, delta_area):
+            plans.append(plan)
+            yield plan
+
+    def infer(plan):
+        image = plan.image
+        return None if image is None else mask(image)
+
+    def progress(done):
+        stats.update(done)
+        if on_progress is not None:
+            on_progress(stats)
+
+    results = map_ordered(infer, tasks(), max_workers, on_result=progress)
+
+    # 按顺序组装，被复用的帧总在复用它的帧之前
+    masks, frames = [], []
+    for plan, result in zip(plans, results):
+        if plan.kind == "exact":
+            masks.append(masks[plan.source])
+            frames.append(frames[plan.source])
+        else:
+            if plan.kind == "full":
+                frame_mask = result
+            elif plan.kind == "similar":
+                frame_mask = masks[plan.source]
+            else:
+                frame_mask = masks[plan.source].copy()
+                frame_mask.paste(result, plan.box[:2])
+            masks.append(frame_mask)
+            frames.append(cutout(plan.frame, frame_mask))
+        stats.kinds[plan.kind] += 1
+    stats.update(len(results))
+    return frames, [plan.duration for plan in plans], stats
@@ -0,0 +1,223 @@
+"""
+分页预览
+
+st.dataframe(df) 会把整张表发给浏览器。这里只取当前页的行，排序和搜索都在服务端完成：
+每列第一次排序或搜索时建立一次排序索引（ColumnIndex），之后的排序是取索引的一段，
+搜索是在有序的不同值上二分查找，翻页只需按行号取出一页，与表的行数无关。
+排序索引每列可达数百 MB，放在单独的 IndexCache 中按内存预算做 LRU 淘汰，
+不计入数据集缓存和查询缓存的预算。
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def _position_dtype(n):
+    return np.int32 if n < 2**31 else np.int64
+
+
+def _sorted_codes(series):
+    """
+    把一列编码为与取值顺序一致的整数
+    :return: (codes, uniques)，uniques 升序排列，缺失值的编码为 len(uniques)
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        perm = categories.argsort()
+        inverse = np.empty(len(perm), dtype=np.int64)
+        inverse[perm] = np.arange(len(perm))
+        codes = series.cat.codes.to_numpy()
+        codes = np.where(codes < 0, len(perm), inverse[np.maximum(codes, 0)])
+        return codes, categories[perm]
+    try:
+        codes, uniques = pd.factorize(series, sort=True)
+    except TypeError:
+        # 混合类型的 object 列无法直接比较，按字符串排序
+        codes, uniques = pd.factorize(series.astype(str).where(series.notna()), sort=True)
+    return np.where(codes < 0, len(uniques), codes), pd.Index(uniques)
+
+
+class ColumnIndex:
+    """
+    一列的排序索引
+    order 为按取值升序（缺失值在最后）排列的行位置，值相同的行保持原有顺序；
+    starts[c] 为第 c 个不同值在 order 中的起始位置，因此每个值（或值区间）对应 order 中连续的一段。
+    """
+
+    def __init__(self, series):
+        codes, self.uniques = _sorted_codes(series)
+        n_unique = len(self.uniques)
+        self.order = np.argsort(codes, kind="stable").astype(_position_dtype(len(codes)))
+        self.starts = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=n_unique + 1))])
+        self.valid = int(self.starts[n_unique])
+        self._descending = None
+        self._rank = None
+
+    @property
+    def nbytes(self):
+        """包括按需生成的降序结果和名次数组"""
+        return sum(a.nbytes for a in (self.order, self.starts, self._descending, self._rank) if a is not None)
+
+    def sorted_positions(self, ascending=True):
+        """全部行位置的排序结果，降序时缺失值仍在最后"""
+        if ascending:
+            return self.order
+        if self._descending is None:
+            self._descending = np.concatenate([self.order[:self.valid][::-1], self.order[self.valid:]])
+        return self._descending
+
+    def rank(self):
+        """每个行位置在升序结果中的名次，用于把其他列搜索到的行按本列排序"""
+        if self._rank is None:
+            self._rank = np.empty_like(self.order)
+            self._rank[self.order] = np.arange(len(self.order), dtype=self.order.dtype)
+        return self._rank
+
+    def lookup(self, term):
+        """
+        查找取值匹配的行：数值列为等于 term，其他列为以 term 开头（区分大小写）
+        在有序的不同值上二分查找，结果是 order 中连续的一段。
+        :return: 行位置数组（按本列取值升序）
+        """
+        lo, hi = self._value_range(term)
+        return self.order[self.starts[lo]:self.starts[hi]]
+
+    def _value_range(self, term):
+        uniques = self.uniques
+        if pd.api.types.is_numeric_dtype(uniques.dtype) and not pd.api.types.is_bool_dtype(uniques.dtype):
+            try:
+                value = float(term)
+            except ValueError:
+                return 0, 0
+            return uniques.searchsorted(value, "left"), uniques.searchsorted(value, "right")
+        if not (pd.api.types.is_string_dtype(uniques.dtype) or uniques.dtype == object):
+            # 日期等类型按字符串形式比较，ISO 格式的字符串顺序与取值顺序一致
+            uniques = uniques.astype(str)
+        try:
+            return uniques.searchsorted(term, "left"), uniques.searchsorted(term + "\U0010ffff", "left")
+        except TypeError:
+            return 0, 0
+
+
+class IndexCache:
+    """
+    排序索引和预览结果的 LRU 缓存
+    可在多个会话间共享，内部加锁。索引在使用中会生成降序结果和名次数组，每次存取时按当前大小重新计算占用。
+    :param max_bytes: 内存预算
+    """
+
+    def __init__(self, max_bytes=512 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return sum(_nbytes(value) for value in self._entries.values())
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._evict()
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        total = self.nbytes
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, old = self._entries.popitem(last=False)
+            total -= _nbytes(old)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "MB": round(self.nbytes / 2**20, 2),
+                    "hits": self.hits, "misses": self.misses}
+
+
+def _nbytes(value):
+    if isinstance(value, ColumnIndex):
+        return value.nbytes
+    _, positions = value
+    return positions.nbytes
+
+
+def _view_token(view):
+    """
+    视图派生结果的标识，作为 IndexCache 键的一部分
+    存放在视图的派生结果字典中，数据集或筛选结果被淘汰后旧的键不会再被访问，随 LRU 淘汰。
+    """
+    return view.artifacts.setdefault("index_token", object())
+
+
+def column_index(view, column, cache):
+    """视图上某列的排序索引，缓存在 cache（IndexCache）中"""
+    key = (_view_token(view), column)
+    index = cache.get(key)
+    if index is None:
+        index = ColumnIndex(view.column(column))
+        cache.put(key, index)
+    return index
+
+
+def preview_positions(view, cache, sort_column=None, ascending=True, search_column=None, term=""):
+    """
+    预览的行位置（视图内的位置）
+    :param cache: 存放排序索引的 IndexCache
+    :return: 行位置数组；不排序也不搜索时返回 None，表示按原顺序
+    """
+    if search_column is None or term == "":
+        if sort_column is None:
+            return None
+        return column_index(view, sort_column, cache).sorted_positions(ascending)
+
+    # 每个视图只保留最近一次的结果，翻页时直接复用
+    params = (sort_column, ascending, search_column, term)
+    last_key = (_view_token(view), "preview")
+    last = cache.get(last_key)
+    if last is not None and last[0] == params:
+        return last[1]
+    matched = column_index(view, search_column, cache).lookup(term)
+    if sort_column is None:
+        positions = np.sort(matched)
+    elif sort_column == search_column and ascending:
+        positions = matched
+    else:
+        # 按排序列的名次重排匹配到的行，只需对匹配的行排序
+        index = column_index(view, sort_column, cache)
+        positions = matched[np.argsort(index.rank()[matched], kind="stable")]
+        if not ascending:
+            valid = index.rank()[positions] < index.valid
+            positions = np.concatenate([positions[valid][::-1], positions[~valid]])
+    cache.put(last_key, (params, positions))
+    return positions
+
+
+def preview_page(view, positions, page, page_size):
+    """
+    取出一页
+    :param positions: preview_positions 的结果
+    :param page: 页码，从 0 开始
+    """
+    start = page * page_size
+    if positions is None:
+        stop = min(start + page_size, len(view))
+        return view.take(np.arange(start, max(stop, start)))
+    return view.take(positions[start:start + page_size])
@@ -0,0 +1,147 @@
+"""
+数据集概况（单次扫描）
+
+把 describe()、isnull().sum()、dtypes、select_dtypes 和各列不同值个数合并到一次计算中：
+数值列拷贝进一个按列连续（Fortran 顺序）的 float64 数组，逐列原地排序一次，
+计数、均值、标准差、最值、分位数和不同值个数都从排好序的数组上向量化得到。
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+QUANTILES = (0.25, 0.5, 0.75)
+
+
+def _percent(q):
+    return f"{q * 100:g}%"
+
+
+def numeric_matrix(df, columns):
+    """把数值列拷贝进 (行数, 列数) 的 Fortran 顺序 float64 数组，缺失值为 NaN"""
+    values = np.empty((len(df), len(columns)), dtype=np.float64, order="F")
+    for j, col in enumerate(columns):
+        values[:, j] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+    return values
+
+
+def sorted_quantiles(values, count, quantiles):
+    """
+    在逐列排好序（NaN 在末尾）的数组上按线性插值取分位数，与 pandas 默认方式一致
+    :param count: 每列非缺失值的个数
+    :return: (len(quantiles), 列数) 的数组，空列为 NaN
+    """
+    result = np.full((len(quantiles), values.shape[1]), np.nan)
+    if len(values) == 0:
+        return result
+    cols = np.arange(values.shape[1])
+    last = np.maximum(count - 1, 0)
+    for i, q in enumerate(quantiles):
+        pos = last * q
+        lo = np.floor(pos).astype(np.intp)
+        hi = np.ceil(pos).astype(np.intp)
+        v_lo, v_hi = values[lo, cols], values[hi, cols]
+        result[i] = v_lo + (v_hi - v_lo) * (pos - lo)
+    result[:, count == 0] = np.nan
+    return result
+
+
+class DatasetProfile:
+    """
+    数据集概况，各属性与对应的 pandas 调用结果格式相同
+    - dtypes: df.dtypes
+    - numeric_columns / categorical_columns: 数值列 / 类别和字符串列
+    - describe: df.describe()
+    - nulls: df.isnull().sum()
+    - cardinality: df.nunique()
+    """
+
+    approximate = False
+
+    def __init__(self, rows, dtypes, numeric_columns, categorical_columns,
+                 describe, nulls, cardinality, seconds):
+        self.rows = rows
+        self.dtypes = dtypes
+        self.numeric_columns = numeric_columns
+        self.categorical_columns = categorical_columns
+        self.describe = describe
+        self.nulls = nulls
+        self.cardinality = cardinality
+        self.seconds = seconds
+
+    @property
+    def shape(self):
+        return self.rows, len(self.dtypes)
+
+    def summary(self):
+        """每列一行的概况表：类型、缺失值、不同值个数"""
+        return pd.DataFrame({
+            "dtype": self.dtypes.astype(str),
+            "nulls": self.nulls,
+            "null %": (self.nulls / max(self.rows, 1) * 100).round(2),
+            "unique": self.cardinality,
+        })
+
+
+def profile_frame(df, quantiles=QUANTILES, running=None):
+    """
+    一次扫描计算数据集概况
+    :param quantiles: describe 中的分位数
+    :param running: 分块读取时累计的 core.csv_stream.RunningStats，
+                    有则直接使用其中的均值、标准差和缺失值（由降位宽前的 float64 数据算出）
+    :return: DatasetProfile
+    """
+    start = time.perf_counter()
+    dtypes = df.dtypes
+    numeric = list(df.select_dtypes(include="number").columns)
+    categorical = list(df.select_dtypes(include=["object", "category", "string", "bool"]).columns)
+
+    values = numeric_matrix(df, numeric)
+    count = np.count_nonzero(~np.isnan(values), axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nansum(values, axis=0) / count
+        std = np.sqrt(np.nansum((values - mean) ** 2, axis=0) / (count - 1))
+    values.sort(axis=0)
+
+    empty = count == 0
+    if len(values):
+        cols = np.arange(values.shape[1])
+        minimum = np.where(empty, np.nan, values[0, cols])
+        maximum = np.where(empty, np.nan, values[np.maximum(count - 1, 0), cols])
+    else:
+        minimum = maximum = np.full(len(numeric), np.nan)
+    # 排好序后相邻两值不同即为一个新的不同值
+    unique = np.count_nonzero((values[1:] != values[:-1]) & ~np.isnan(values[1:]), axis=0) + ~empty
+
+    if running is not None:
+        stats = running.describe().reindex(columns=numeric)
+        mean = np.where(stats.loc["mean"].isna(), mean, stats.loc["mean"])
+        std = np.where(stats.loc["std"].isna(), std, stats.loc["std"])
+
+    describe = pd.DataFrame(
+        np.vstack([count, mean, std, minimum, sorted_quantiles(values, count, quantiles), maximum]),
+        index=["count", "mean", "std", "min"] + [_percent(q) for q in quantiles] + ["max"],
+        columns=numeric,
+    )
+
+    nulls = pd.Series(0, index=df.columns, dtype=np.int64)
+    nulls[numeric] = len(df) - count
+    numeric_set = set(numeric)
+    others = [col for col in df.columns if col not in numeric_set]
+    if running is not None:
+        nulls[others] = running.null_counts().reindex(others).fillna(0).astype(np.int64)
+    elif others:
+        nulls[others] = df[others].isna().sum()
+
+    cardinality = pd.Series(0, index=df.columns, dtype=np.int64)
+    cardinality[numeric] = unique
+    for col in others:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            codes = s.cat.codes.to_numpy()
+            cardinality[col] = np.unique(codes[codes >= 0]).size
+        else:
+            cardinality[col] = s.nunique()
+
+    return DatasetProfile(len(df), dtypes, numeric, categorical, describe, nulls, cardinality,
+                          time.perf_counter() - start)
@@ -0,0 +1,292 @@
+"""
+惰性筛选与分组查询
+
+页面上的筛选条件和分组先组成查询计划（Query），只有图表或表格真正要数据时才执行：
+- 谓词下推：条件按添加顺序逐个求值，后面的条件只在前面留下的行上计算，不生成中间 DataFrame
+- 列裁剪：取数据时只取用到的列，未筛选时直接返回原表，不做拷贝
+- 结果缓存：每个条件前缀对应的行号、分组结果和派生结果按内存预算做 LRU 缓存，
+  重跑或在已有条件后追加条件时直接复用
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# 运算符 -> 显示名称
+OPS = {
+    "==": "等于",
+    "!=": "不等于",
+    ">": "大于",
+    ">=": "大于等于",
+    "<": "小于",
+    "<=": "小于等于",
+    "between": "介于",
+    "isin": "属于",
+    "contains": "包含文本",
+    "isnull": "为空",
+    "notnull": "不为空",
+}
+AGGREGATIONS = ("count", "sum", "mean", "min", "max", "median")
+
+
+class Filter:
+    """
+    单列条件
+    :param op: OPS 中的运算符
+    :param value: between 为 (下界, 上界)，isin 为值列表，isnull/notnull 不需要
+    """
+
+    def __init__(self, column, op, value=None):
+        if op not in OPS:
+            raise ValueError(f"未知的运算符: {op}")
+        self.column = column
+        self.op = op
+        self.value = tuple(value) if isinstance(value, (list, tuple)) else value
+
+    @property
+    def key(self):
+        return self.column, self.op, self.value
+
+    def __repr__(self):
+        value = "" if self.op in ("isnull", "notnull") else f" {self.value!r}"
+        return f"{self.column} {OPS[self.op]}{value}"
+
+    def mask(self, series):
+        """在给定的列（可以只是部分行）上求值，返回布尔数组"""
+        op, value = self.op, self.value
+        if isinstance(series.dtype, pd.CategoricalDtype) and op in ("isin", "==", "!="):
+            # 类别列直接在编码上查表，比逐值比较快得多
+            wanted = value if op == "isin" else (value,)
+            table = np.zeros(len(series.cat.categories) + 1, dtype=bool)
+            table[series.cat.categories.get_indexer(pd.Index(wanted)) % (len(table))] = True
+            table[-1] = False
+            hit = table[series.cat.codes.to_numpy()]
+            return ~hit if op == "!=" else hit
+        if op == "isnull":
+            result = series.isna()
+        elif op == "notnull":
+            result = series.notna()
+        elif op == "between":
+            result = series.between(*value)
+        elif op == "isin":
+            result = series.isin(value)
+        elif op == "contains":
+            result = series.astype(str).str.contains(str(value), regex=False)
+        else:
+            result = {
+                "==": series.__eq__, "!=": series.__ne__, ">": series.__gt__,
+                ">=": series.__ge__, "<": series.__lt__, "<=": series.__le__,
+            }[op](value)
+        return result.fillna(False).to_numpy(dtype=bool)
+
+
+class Query:
+    """
+    查询计划：若干条件（按 AND 组合）以及可选的分组汇总
+    :param group_by: 分组列
+    :param aggregations: {列: 汇总函数}，函数取自 AGGREGATIONS；分组列本身不参与汇总
+    """
+
+    def __init__(self, filters=(), group_by=(), aggregations=None):
+        self.filters = list(filters)
+        self.group_by = list(group_by)
+        self.aggregations = {col: agg for col, agg in (aggregations or {}).items() if col not in self.group_by}
+
+    @property
+    def filter_key(self):
+        return tuple(f.key for f in self.filters)
+
+    @property
+    def key(self):
+        return self.filter_key, tuple(self.group_by), tuple(sorted(self.aggregations.items()))
+
+    @property
+    def columns(self):
+        """执行该查询需要读取的列"""
+        names = [f.column for f in self.filters] + self.group_by + list(self.aggregations)
+        return list(dict.fromkeys(names))
+
+
+class QueryEngine:
+    """
+    在一个数据集上执行查询，并缓存中间结果
+    可在多个会话间共享，内部加锁。
+    :param base_artifacts: 未筛选时使用的派生结果字典（通常是 CachedDataset.artifacts）
+    :param max_bytes: 缓存的行号和分组结果的内存预算
+    """
+
+    def __init__(self, df, base_artifacts=None, max_bytes=256 * 1024 ** 2):
+        self.df = df
+        self.base_artifacts = base_artifacts if base_artifacts is not None else {}
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            item = self._memo.get(key)
+            if item is not None:
+                self._memo.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            self.misses += 1
+            return None
+
+    def _put(self, key, value, nbytes):
+        with self._lock:
+            self._memo[key] = (value, nbytes)
+            self._memo.move_to_end(key)
+            total = sum(size for _, size in self._memo.values())
+            while total > self.max_bytes and len(self._memo) > 1:
+                _, (_, size) = self._memo.popitem(last=False)
+                total -= size
+
+    @property
+    def nbytes(self):
+        return sum(size for _, size in self._memo.values())
+
+    def _selection(self, filters):
+        """
+        (行号, 派生结果字典)，派生结果与行号一起缓存和淘汰，其大小不计入预算
+        派生结果只放概况、相关系数等小对象，排序索引在 preview.IndexCache 中单独计预算。
+        """
+        key = ("rows", tuple(f.key for f in filters))
+        selection = self._get(key)
+        if selection is not None:
+            return selection
+
+        previous = self.rows(filters[:-1])
+        series = self.df[filters[-1].column]
+        if previous is None:
+            rows = np.flatnonzero(filters[-1].mask(series))
+        elif previous.size > len(self.df) // 4:
+            # 剩下的行还很多时，整列求值再取子集比先按行号取值更快
+            rows = previous[filters[-1].mask(series)[previous]]
+        else:
+            rows = previous[filters[-1].mask(series.iloc[previous])]
+        selection = (rows, {})
+        self._put(key, selection, rows.nbytes)
+        return selection
+
+    def rows(self, filters):
+        """
+        满足全部条件的行号（升序），没有条件时返回 None 表示全部行
+        从最长的已缓存前缀开始，其余条件只在剩下的行上求值。
+        """
+        return self._selection(filters)[0] if filters else None
+
+    def artifacts(self, filters):
+        """筛选结果上的派生结果（概况、相关系数等），未筛选时即 base_artifacts"""
+        return self._selection(filters)[1] if filters else self.base_artifacts
+
+    def options(self, column, max_values=1000):
+        """筛选该列时可用的运算符和候选值，缓存在 base_artifacts 中"""
+        key = ("filter_options", column)
+        if key not in self.base_artifacts:
+            self.base_artifacts[key] = filter_options(self.df[column], max_values)
+        return self.base_artifacts[key]
+
+    def grouped(self, query):
+        """分组汇总结果（DataFrame）"""
+        key = ("grouped", query.key)
+        result = self._get(key)
+        if result is not None:
+            return result
+        view = LazyView(self, Query(query.filters))
+        frame = view.frame(query.columns)
+        if query.aggregations:
+            result = frame.groupby(query.group_by, observed=True, dropna=False).agg(query.aggregations)
+        else:
+            result = frame.groupby(query.group_by, observed=True, dropna=False).size().to_frame("count")
+        result = result.reset_index()
+        self._put(key, result, int(result.memory_usage(deep=True).sum()))
+        return result
+
+    def view(self, query=None):
+        return LazyView(self, query or Query())
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._memo), "MB": round(self.nbytes / 2**20, 2),
+                    "hits": self.hits, "misses": self.misses}
+
+
+class LazyView:
+    """
+    查询结果的惰性视图，取数据时才执行筛选
+    未筛选时所有方法都直接使用原表。
+    """
+
+    def __init__(self, engine, query):
+        self.engine = engine
+        self.query = query
+
+    @property
+    def is_base(self):
+        return not self.query.filters
+
+    @property
+    def key(self):
+        return self.query.filter_key
+
+    @property
+    def rows(self):
+        return self.engine.rows(self.query.filters)
+
+    @property
+    def artifacts(self):
+        return self.engine.artifacts(self.query.filters)
+
+    def __len__(self):
+        rows = self.rows
+        return len(self.engine.df) if rows is None else len(rows)
+
+    @property
+    def columns(self):
+        return self.engine.df.columns
+
+    def frame(self, columns=None):
+        """
+        取出筛选后的数据，只包含 columns 中的列
+        未筛选且不裁剪列时返回原表本身（不可修改）。
+        """
+        df = self.engine.df
+        if columns is not None:
+            df = df[list(columns)]
+        rows = self.rows
+        return df if rows is None else df.iloc[rows]
+
+    def column(self, name):
+        return self.frame([name])[name]
+
+    def head(self, n=5):
+        rows = self.rows
+        return self.engine.df.head(n) if rows is None else self.engine.df.iloc[rows[:n]]
+
+    def take(self, positions):
+        """按视图内的行位置取行"""
+        rows = self.rows
+        return self.engine.df.iloc[positions if rows is None else rows[positions]]
+
+    def grouped(self):
+        return self.engine.grouped(self.query) if self.query.group_by else None
+
+
+def filter_options(series, max_values=1000):
+    """
+    适合该列的运算符和候选值
+    :return: (运算符列表, 候选值列表或 None)；不同值不超过 max_values 的非数值列给出候选值
+    """
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return [">=", "<=", ">", "<", "between", "==", "!=", "isnull", "notnull"], None
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        values = list(series.cat.categories)
+    else:
+        values = series.dropna().unique()
+        values = list(values[:max_values + 1])
+    if len(values) > max_values:
+        return ["contains", "==", "!=", "isnull", "notnull"], None
+    return ["isin", "==", "!=", "contains", "isnull", "notnull"], sorted(values, key=str)
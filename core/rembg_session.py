@@ -0,0 +1,155 @@
+"""
+rembg 模型会话
+
+rembg.remove(image) 不传 session 时每次调用都会新建 onnxruntime 会话：重新读取模型文件、
+构建计算图并分配内存，GIF 的每一帧都要付出这份开销。这里按 (模型, 线程数) 只创建一次会话，
+在所有调用和会话间共享（InferenceSession.run 本身是线程安全的），并记录加载耗时和内存增量。
+"""
+import os
+import resource
+import threading
+import time
+
+from PIL import Image
+
+DEFAULT_MODEL = "u2net"
+# 常用模型，完整列表见 rembg.sessions.sessions_names
+MODELS = ("u2net", "u2netp", "u2net_human_seg", "silueta", "isnet-general-use", "isnet-anime")
+
+
+def rss_bytes():
+    """当前进程的常驻内存（字节），取不到时退化为峰值常驻内存"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def session_options(intra_op_threads=0, inter_op_threads=0):
+    """
+    onnxruntime 会话选项
+    :param intra_op_threads: 单个算子内部的线程数，0 表示由 onnxruntime 决定（通常为物理核数）
+    :param inter_op_threads: 算子之间并行的线程数，0 表示默认
+    """
+    import onnxruntime as ort
+
+    opts = ort.SessionOptions()
+    if intra_op_threads:
+        opts.intra_op_num_threads = int(intra_op_threads)
+    if inter_op_threads:
+        opts.inter_op_num_threads = int(inter_op_threads)
+    return opts
+
+
+def create_session(model_name=DEFAULT_MODEL, intra_op_threads=0, inter_op_threads=0):
+    """
+    新建 rembg 会话
+    rembg.new_session 只能通过 OMP_NUM_THREADS 环境变量设置线程数，这里直接用会话类构造，
+    以便传入自己的 SessionOptions；旧版本没有 sessions_class 时退回 new_session。
+    """
+    try:
+        from rembg.sessions import sessions_class
+    except ImportError:
+        from rembg import new_session
+        return new_session(model_name)
+    for session_class in sessions_class:
+        if session_class.name() == model_name:
+            return session_class(model_name, session_options(intra_op_threads, inter_op_threads))
+    raise ValueError(f"未知的 rembg 模型: {model_name}")
+
+
+def cutout(image, mask):
+    """按掩码抠出前景，与 rembg.remove 默认（不做 alpha matting）的结果相同"""
+    return Image.composite(image, Image.new("RGBA", image.size, 0), mask)
+
+
+class ModelSession:
+    """已加载的模型会话及其加载开销"""
+
+    def __init__(self, model_name, intra_op_threads, inter_op_threads, session, load_seconds, memory_bytes):
+        self.model_name = model_name
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.session = session
+        self.load_seconds = load_seconds
+        self.memory_bytes = memory_bytes
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def remove(self, image, **kwargs):
+        """用本会话移除背景，参数同 rembg.remove"""
+        from rembg import remove
+
+        with self._lock:
+            self.calls += 1
+        return remove(image, session=self.session, **kwargs)
+
+    def mask(self, image):
+        """只返回前景掩码（L 模式），可与 cutout 组合，同一个掩码用于多张图"""
+        return self.remove(image, only_mask=True)
+
+    def summary(self):
+        return {
+            "模型": self.model_name,
+            "线程(算子内/算子间)": f"{self.intra_op_threads or '默认'}/{self.inter_op_threads or '默认'}",
+            "加载耗时(秒)": round(self.load_seconds, 2),
+            "内存增量(MB)": round(self.memory_bytes / 2**20, 1),
+            "调用次数": self.calls,
+        }
+
+
+class SessionManager:
+    """
+    进程内共享的会话表，键为 (模型, 算子内线程数, 算子间线程数)
+    同一个键只加载一次；不同键各自加锁，加载一个模型时不阻塞其他已加载模型的使用。
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name=DEFAULT_MODEL, intra_op_threads=0, inter_op_threads=0):
+        key = (model_name, int(intra_op_threads), int(inter_op_threads))
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is not None:
+                return entry
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            # 等锁期间可能已由其他会话加载完成
+            with self._lock:
+                entry = self._sessions.get(key)
+            if entry is not None:
+                return entry
+            rss = rss_bytes()
+            start = time.perf_counter()
+            session = create_session(*key)
+            entry = ModelSession(*key, session, time.perf_counter() - start, max(rss_bytes() - rss, 0))
+            with self._lock:
+                self._sessions[key] = entry
+                self._loading.pop(key, None)
+            return entry
+
+    def release(self, model_name, intra_op_threads=0, inter_op_threads=0):
+        """释放一个会话，正在使用它的调用不受影响"""
+        with self._lock:
+            self._sessions.pop((model_name, int(intra_op_threads), int(inter_op_threads)), None)
+
+    def stats(self):
+        with self._lock:
+            return [entry.summary() for entry in self._sessions.values()]
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager():
+    """进程内唯一的 SessionManager，页面和脚本共用，同一模型在进程内只有一份"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = SessionManager()
+        return _manager
@@ -0,0 +1,152 @@
+"""
+抠图结果磁盘缓存
+
+同一张图重复上传时不必重新推理。结果文件按 输入内容哈希 + 模型 + 输出选项 命名，
+放在缓存目录下，所有会话和进程共享；总大小超过上限时按最近使用时间淘汰。
+命中时更新文件的修改时间，淘汰时先删修改时间最早的文件。
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("STREAMLIT_APP_CACHE_DIR",
+                                        Path(tempfile.gettempdir()) / "streamlit_app_cache")) / "rembg"
+
+
+def content_digest(data):
+    """
+    输入内容的哈希
+    :param data: bytes 或 memoryview（如 UploadedFile.getbuffer()，不复制上传内容）
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def result_key(digest, **options):
+    """
+    结果的键：输入内容哈希 + 影响输出的选项
+    :param digest: content_digest 的结果，调用方可按上传缓存，选项变化时不必重新读取整个文件
+    :param options: 模型名称、输出格式参数等，不影响输出的参数（如线程数）不要传入
+    """
+    key = hashlib.blake2b(digest.encode(), digest_size=16)
+    key.update(json.dumps(options, sort_keys=True, default=str).encode())
+    return key.hexdigest()
+
+
+class ResultCache:
+    """
+    内容寻址的结果文件缓存
+    :param max_bytes: 缓存目录的总大小上限
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=1024 ** 3):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def path(self, key, suffix):
+        return self.cache_dir / key[:2] / f"{key}{suffix}"
+
+    def get(self, key, suffix, count=True):
+        """
+        命中时返回结果文件路径，否则返回 None
+        未命中不在这里计数，而是在 put 时计，页面重跑但用户没有开始处理时不算未命中。
+        :param count: 是否计一次命中；页面重跑时对同一次上传重复查找应传 False
+        """
+        path = self.path(key, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        if count:
+            with self._lock:
+                self.hits += 1
+        return path
+
+    def put(self, key, suffix, source):
+        """
+        把处理好的文件复制进缓存，计一次未命中
+        :param source: 结果文件路径
+        :return: 缓存中的文件路径
+        """
+        path = self.path(key, suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再改名，并发会话不会读到写了一半的文件
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out, open(source, "rb") as src:
+                while True:
+                    chunk = src.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        with self._lock:
+            self.misses += 1
+        self.evict(keep=path)
+        return path
+
+    def _entries(self):
+        """[(修改时间, 大小, 路径)]"""
+        entries = []
+        if not self.cache_dir.exists():
+            return entries
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self, keep=None):
+        """删除最久未使用的文件，直到总大小不超过上限；keep 为刚写入的文件，不会被删除"""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if path == str(keep):
+                    continue
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in self._entries():
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "文件数": len(entries),
+                "MB": round(sum(size for _, size, _ in entries) / 2**20, 2),
+                "上限(MB)": round(self.max_bytes / 2**20),
+                "命中": self.hits,
+                "未命中": self.misses,
+                "命中率": f"{self.hits / lookups:.0%}" if lookups else "-",
+                "淘汰": self.evictions,
+            }
@@ -0,0 +1,337 @@
+"""
+近似统计（可合并的流式摘要）
+
+数据量很大时精确的分位数和不同值个数需要整列排序，这里改用固定大小的摘要：
+- KLLSketch: 分位数，秩误差与数据量无关
+- HyperLogLog: 不同值个数
+- FixedHistogram: 固定分箱直方图
+每种摘要都可以合并，数据按行分块后可并行计算再合并。
+sketch_frame() 返回的 SketchProfile 与 core.profile.DatasetProfile 接口相同，页面可以直接替换。
+"""
+import itertools
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from core.profile import QUANTILES, DatasetProfile, _percent, numeric_matrix
+
+
+class KLLSketch:
+    """
+    KLL 分位数摘要（Karnin, Lang, Liberty 2016）
+    第 h 层的每个元素代表 2^h 个原始值，层越低容量越小（按 2/3 递减），
+    某层超出容量时排序后随机保留奇数位或偶数位元素升到上一层。
+    :param k: 最高层容量，越大越精确
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def update(self, values, level=0):
+        """
+        :param level: 加入的层，每个值代表 2^level 个原始值（用于按 2^level 步长抽样后的数据）
+        """
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.n += values.size << level
+        while len(self.levels) <= level:
+            self.levels.append(np.empty(0))
+        self.levels[level] = np.concatenate([self.levels[level], values])
+        self._compress()
+
+    def merge(self, other):
+        for h, items in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        self._compress()
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if items.size <= self._capacity(h):
+                h += 1
+                continue
+            if h + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(items)
+            # 奇数个时留下最大的一个，其余两两合并为一个
+            keep, items = items[items.size - items.size % 2:], items[:items.size - items.size % 2]
+            self.levels[h + 1] = np.concatenate([self.levels[h + 1], items[self._rng.integers(2)::2]])
+            self.levels[h] = keep
+            # 新增一层后低层容量变小，从头检查
+            h = 0
+
+    def quantile(self, quantiles):
+        """
+        :param quantiles: 0~1 之间的分位点
+        :return: 对应的近似分位数，空摘要返回 NaN
+        """
+        quantiles = np.atleast_1d(quantiles)
+        if self.n == 0:
+            return np.full(quantiles.shape, np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(level.size, 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items, cumulative = items[order], np.cumsum(weights[order])
+        idx = np.searchsorted(cumulative, quantiles * cumulative[-1], side="left")
+        return items[np.minimum(idx, items.size - 1)]
+
+    def rank_error(self):
+        """单个分位数的归一化秩误差（99% 置信度，取 Apache DataSketches 的经验公式）"""
+        if self.n <= self.k:
+            return 0.0
+        return 2.296 / self.k ** 0.9723
+
+
+def _bit_length(values):
+    """
+    uint64 数组每个元素的位长（0 的位长为 0）
+    高低 32 位分别转成 float64（精确表示）后用 frexp 取指数，不依赖 numpy 2 的 bitwise_count。
+    """
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+class HyperLogLog:
+    """
+    HyperLogLog 不同值个数估计（Flajolet 等 2007）
+    值先用 pandas 的 hash_array 散列成 64 位，前 p 位选寄存器，其余位的前导零个数 + 1 记入寄存器。
+    :param p: 寄存器个数为 2^p
+    """
+
+    def __init__(self, p=14):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def update(self, values):
+        values = np.asarray(values)
+        if values.dtype.kind == "f":
+            values = values[~np.isnan(values)]
+        else:
+            values = pd.Series(values).dropna().to_numpy()
+        if values.size == 0:
+            return
+        hashed = pd.util.hash_array(values)
+        bits = 64 - self.p
+        idx = (hashed >> np.uint64(bits)).astype(np.intp)
+        rest = hashed & np.uint64((1 << bits) - 1)
+        rho = (bits + 1 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rho)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = self.registers.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if raw <= 2.5 * m and zeros:
+            # 小基数时用线性计数
+            return m * np.log(m / zeros)
+        return raw
+
+    def relative_error(self):
+        """估计值的标准误差（相对值）"""
+        return 1.04 / np.sqrt(self.registers.size)
+
+
+class FixedHistogram:
+    """
+    固定分箱直方图，分箱相同的直方图直接相加即可合并
+    :param lo: 下界
+    :param hi: 上界
+    """
+
+    def __init__(self, lo, hi, bins=50):
+        if not np.isfinite(lo) or not np.isfinite(hi):
+            lo, hi = 0.0, 1.0
+        if lo == hi:
+            lo, hi = lo - 0.5, hi + 0.5
+        self.edges = np.linspace(lo, hi, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    def update(self, values):
+        values = values[~np.isnan(values)]
+        bins = self.counts.size
+        idx = ((values - self.edges[0]) * (bins / (self.edges[-1] - self.edges[0]))).astype(np.intp)
+        self.counts += np.bincount(np.clip(idx, 0, bins - 1), minlength=bins)
+
+    def merge(self, other):
+        self.counts += other.counts
+
+
+def dkw_error(samples, confidence=0.99):
+    """样本经验分布与总体分布的最大偏差上界（Dvoretzky-Kiefer-Wolfowitz 不等式）"""
+    if samples == 0:
+        return 0.0
+    return float(np.sqrt(np.log(2 / (1 - confidence)) / (2 * samples)))
+
+
+class ColumnSketch:
+    """
+    单个数值列的摘要：精确的计数、矩和最值，近似的分位数、不同值个数和直方图
+    KLL 的输入只需要分位数精度：每块超过 sample_size 个值时按 2^L 步长等距抽样后放入第 L 层，
+    省去整块排序；计数、矩、直方图和 HyperLogLog 仍使用全部值。
+    """
+
+    def __init__(self, lo, hi, bins=50, k=200, p=14, sample_size=2**16, seed=None):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.samples = 0
+        self.sample_size = sample_size
+        self.kll = KLLSketch(k, seed)
+        self.hll = HyperLogLog(p)
+        self.histogram = FixedHistogram(lo, hi, bins)
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        valid = values[~np.isnan(values)]
+        if valid.size:
+            mean = valid.mean()
+            self._merge_moments(valid.size, mean, np.sum((valid - mean) ** 2))
+        level = max(int(np.log2(max(valid.size, 1) / self.sample_size)), 0)
+        sampled = valid[self._rng.integers(1 << level)::1 << level]
+        self.samples += sampled.size if level else 0
+        self.kll.update(sampled, level)
+        self.hll.update(valid)
+        self.histogram.update(valid)
+
+    def quantile_error(self):
+        """分位数的秩误差上界：KLL 误差加上抽样误差（未抽样时为 0）"""
+        return self.kll.rank_error() + dkw_error(self.samples)
+
+    def merge(self, other):
+        if other.count:
+            self._merge_moments(other.count, other.mean, other.m2)
+        self.samples += other.samples
+        self.kll.merge(other.kll)
+        self.hll.merge(other.hll)
+        self.histogram.merge(other.histogram)
+
+    def _merge_moments(self, n_b, mean_b, m2_b):
+        n = self.count + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta ** 2 * self.count * n_b / n
+        self.count = n
+
+
+class SketchProfile(DatasetProfile):
+    """
+    近似数据集概况，接口同 DatasetProfile
+    count/mean/std/min/max 和缺失值是精确的，分位数和不同值个数是近似值。
+    """
+
+    approximate = True
+
+    def __init__(self, sketches, quantile_error, distinct_error, **kwargs):
+        super().__init__(**kwargs)
+        self.sketches = sketches
+        self.quantile_error = quantile_error
+        self.distinct_error = distinct_error
+
+    def histogram(self, column):
+        """:return: (counts, edges)"""
+        hist = self.sketches[column].histogram
+        return hist.counts, hist.edges
+
+
+def _sketch_chunk(df, columns, lows, highs, bins, k, p, sample_size, seed):
+    values = numeric_matrix(df, columns)
+    sketches = [ColumnSketch(lo, hi, bins, k, p, sample_size, seed) for lo, hi in zip(lows, highs)]
+    for j, sketch in enumerate(sketches):
+        sketch.update(values[:, j])
+    return sketches
+
+
+def sketch_frame(df, chunk_rows=1_000_000, max_workers=None, bins=50, k=200, p=14,
+                 sample_size=2**16, quantiles=QUANTILES, seed=0):
+    """
+    用可合并摘要计算近似数据集概况
+    先取各数值列的最值确定直方图分箱，再按行分块在线程池中并行计算摘要（numpy 排序和散列会释放 GIL），最后合并。
+    每块只拷贝自己的行，同时在处理的块数不超过线程数，额外内存与 chunk_rows × 线程数成正比，而不是整张表。
+    类别和字符串列的不同值个数仍用哈希表精确计算（逐值散列并不比它快）。
+    :param chunk_rows: 每块行数
+    :param max_workers: 线程数，默认为 CPU 核数
+    :param bins: 直方图分箱数
+    :param k: KLL 摘要大小
+    :param p: HyperLogLog 寄存器位数
+    :param sample_size: 每块每列送入 KLL 的值个数上限
+    :return: SketchProfile
+    """
+    start = time.perf_counter()
+    numeric = list(df.select_dtypes(include="number").columns)
+    categorical = list(df.select_dtypes(include=["object", "category", "string", "bool"]).columns)
+    lows = np.array([df[col].min() for col in numeric], dtype=np.float64)
+    highs = np.array([df[col].max() for col in numeric], dtype=np.float64)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    starts = iter(range(0, max(len(df), 1), chunk_rows))
+    sketches = None
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        def submit(i):
+            return pool.submit(_sketch_chunk, df.iloc[i:i + chunk_rows], numeric, lows, highs,
+                               bins, k, p, sample_size, seed + i)
+
+        pending = deque(submit(i) for i in itertools.islice(starts, max_workers))
+        # 按顺序合并，每合并一块再提交一块
+        while pending:
+            part = pending.popleft().result()
+            if sketches is None:
+                sketches = part
+            else:
+                for sketch, other in zip(sketches, part):
+                    sketch.merge(other)
+            for i in itertools.islice(starts, 1):
+                pending.append(submit(i))
+
+    count = np.array([s.count for s in sketches], dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(count > 0, [s.mean for s in sketches], np.nan)
+        std = np.sqrt(np.array([s.m2 for s in sketches]) / (count - 1))
+    qs = np.array([s.kll.quantile(quantiles) for s in sketches]).reshape(len(sketches), len(quantiles)).T
+    describe = pd.DataFrame(
+        np.vstack([count, mean, std, lows, qs, highs]),
+        index=["count", "mean", "std", "min"] + [_percent(q) for q in quantiles] + ["max"],
+        columns=numeric,
+    )
+
+    numeric_set = set(numeric)
+    others = [col for col in df.columns if col not in numeric_set]
+    nulls = pd.Series(0, index=df.columns, dtype=np.int64)
+    nulls[numeric] = (len(df) - count).astype(np.int64)
+    cardinality = pd.Series(0, index=df.columns, dtype=np.int64)
+    cardinality[numeric] = [round(s.hll.estimate()) for s in sketches]
+    for col in others:
+        s = df[col]
+        nulls[col] = s.isna().sum()
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            codes = s.cat.codes.to_numpy()
+            cardinality[col] = np.unique(codes[codes >= 0]).size
+        else:
+            cardinality[col] = s.nunique()
+
+    return SketchProfile(
+        sketches=dict(zip(numeric, sketches)),
+        quantile_error=max((s.quantile_error() for s in sketches), default=0.0),
+        distinct_error=HyperLogLog(p).relative_error(),
+        rows=len(df), dtypes=df.dtypes, numeric_columns=numeric, categorical_columns=categorical,
+        describe=describe, nulls=nulls, cardinality=cardinality, seconds=time.perf_counter() - start,
+    )